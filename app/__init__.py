@@ -0,0 +1 @@
+from . import startup # starts the startup clock before anything else is imported
@@ -0,0 +1,174 @@
+import asyncio
+import math
+import time
+from collections import deque
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from .cache import TTLCache
+from .config import settings
+from .oauth2 import verify_access_token
+
+# Admission control and load shedding (see `Settings.admission_control`).
+#
+# When Postgres slows down, every request still gets a threadpool thread and waits on the database, the queue in front
+# of the threadpool grows without limit, and eventually every request times out. Instead, each route group gets:
+#
+# - a concurrency limit: at most `admission_limits[group]` requests of the group run at once, so a slow group (e.g.
+#   login, which is CPU bound on password hashing) can't take every thread from the others;
+# - a bounded wait queue: up to `admission_max_queue` more requests wait for a slot, each for at most
+#   `admission_queue_timeout` seconds. Past that they get a fast 503 with `Retry-After`, while the requests that were
+#   admitted keep their normal latency;
+# - a per-user token bucket (`rate_limit_per_second`, `rate_limit_burst`), keyed by the user id of the bearer token or
+#   by the client address for anonymous requests. Over the limit: 429 with `Retry-After`.
+#
+# The limits are per worker process. Paths outside the groups (`/`, `/metrics`, `/internal/...`) are never limited.
+
+ROUTE_GROUPS = (
+    ("/login", "login"),
+    ("/vote", "vote"),
+    ("/posts", "posts"),
+    ("/user", "user"),
+)
+
+def route_group(path: str) -> str | None:
+    for prefix, group in ROUTE_GROUPS:
+        if path == prefix or path.startswith(prefix + "/"):
+            return group
+    return None
+
+class ConcurrencyLimiter:
+    # Only used from the event loop (the middleware runs there, before the threadpool), so it needs no lock.
+    def __init__(self, name: str, limit: int, max_queue: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.rejected = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+            return True
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return True # the slot was handed over just as the deadline passed
+            waiter.cancel()
+            self.rejected += 1
+            return False
+        except asyncio.CancelledError:
+            # The client went away while waiting. A slot handed over meanwhile goes to the next waiter.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self):
+        # The slot goes straight to the oldest waiter that is still waiting, `active` stays the same
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "active": self.active, "waiting": len(self._waiters), "rejected": self.rejected}
+
+limiters = {
+    group: ConcurrencyLimiter(group, limit, settings.admission_max_queue, settings.admission_queue_timeout)
+    for group, limit in settings.admission_limits.items()
+}
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        # 0 when the request may go, otherwise the number of seconds until a token is available
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+# A bucket left alone for `burst / rate` seconds is full again, which is the same as not having one
+rate_limit_buckets = TTLCache(
+    "rate_limit_buckets",
+    maxsize=100_000,
+    ttl=settings.rate_limit_burst / settings.rate_limit_per_second if settings.rate_limit_per_second > 0 else 0,
+)
+
+def rate_limit_key(scope) -> str:
+    for name, value in scope["headers"]:
+        if name == b"authorization" and value[:7].lower() == b"bearer ":
+            try:
+                return f"user:{verify_access_token(value[7:].decode(), HTTPException(status.HTTP_401_UNAUTHORIZED)).user_id}"
+            except HTTPException:
+                break # invalid token: rejected by the endpoint anyway, rate limited as anonymous
+    client = scope.get("client")
+    return f"addr:{client[0] if client else 'unknown'}"
+
+def rate_limit(scope) -> float:
+    key = rate_limit_key(scope)
+    bucket = rate_limit_buckets.get(key)
+    if bucket is None:
+        bucket = TokenBucket(settings.rate_limit_per_second, settings.rate_limit_burst)
+    wait = bucket.take()
+    rate_limit_buckets.set(key, bucket) # refreshes the entry's TTL
+    return wait
+
+class AdmissionMiddleware:
+    # Plain ASGI middleware, added inside `MetricsMiddleware` so that rejections show up in the metrics. A rejected
+    # request never reaches routing: its group is recorded in the scope, and the metrics label it `group:<name>`.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        group = route_group(scope["path"]) if scope["type"] == "http" else None
+        if group is None:
+            return await self.app(scope, receive, send)
+
+        if settings.rate_limit_per_second > 0:
+            wait = rate_limit(scope)
+            if wait > 0:
+                scope["admission_rejected_group"] = group
+                response = JSONResponse(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    content={"detail": "Too many requests, slow down."},
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+                return await response(scope, receive, send)
+
+        limiter = limiters.get(group)
+        if limiter is None:
+            return await self.app(scope, receive, send)
+        if not await limiter.acquire():
+            scope["admission_rejected_group"] = group
+            response = JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": "Server is busy, retry shortly."},
+                headers={"Retry-After": "1"},
+            )
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
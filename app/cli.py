@@ -0,0 +1,87 @@
+import argparse
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlmodel import Session
+from .database import engine
+from .models import CreateUser
+from .routers.user import bulk_insert_users
+from . import utils
+
+# Maintenance commands, run from the project root:
+#   python -m app.cli reconcile-votes
+#   python -m app.cli import-users users.ndjson [--batch-size 1000]
+
+# Recomputes `post.votes_count` from the vote table and fixes the rows that drifted
+# (e.g. votes removed by a cascade, or manual edits in the database). Returns the ids of the repaired posts.
+RECONCILE_VOTES_SQL = text("""
+    UPDATE post
+    SET votes_count = counts.votes
+    FROM (
+        SELECT post.id, count(vote.post_id) AS votes
+        FROM post LEFT JOIN vote ON vote.post_id = post.id
+        GROUP BY post.id
+    ) AS counts
+    WHERE post.id = counts.id AND post.votes_count <> counts.votes
+    RETURNING post.id
+""")
+
+def reconcile_votes(session: Session) -> list[int]:
+    repaired = [row.id for row in session.exec(RECONCILE_VOTES_SQL)]
+    session.commit()
+    return repaired
+
+# Imports users from an NDJSON file (one `CreateUser` object per line), like POST /user/bulk: each batch is hashed in
+# parallel on the hashing pool and inserted set-based. Invalid lines and conflicting users are reported and skipped.
+def import_users(session: Session, path: str, batch_size: int) -> tuple[int, int, int]:
+    created = conflicts = invalid = 0
+
+    def flush(batch: list[tuple[int, CreateUser]]):
+        nonlocal created, conflicts
+        users = [user for _, user in batch]
+        results = bulk_insert_users(session, users, utils.hash_passwords([user.password for user in users]))
+        for (line_number, _), result in zip(batch, results):
+            if result.status == "created":
+                created += 1
+            else:
+                conflicts += 1
+                print(f"line {line_number}: {result.username}: {result.detail}")
+
+    batch = []
+    with open(path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                batch.append((line_number, CreateUser.model_validate_json(line)))
+            except ValidationError as e:
+                invalid += 1
+                print(f"line {line_number}: invalid user: {e.errors(include_url=False)}")
+                continue
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+    if batch:
+        flush(batch)
+    return created, conflicts, invalid
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("reconcile-votes", help="Repair post.votes_count from the vote table.")
+    import_parser = commands.add_parser("import-users", help="Bulk import users from an NDJSON file.")
+    import_parser.add_argument("path", help="NDJSON file, one {username, email, full_name, password} object per line")
+    import_parser.add_argument("--batch-size", type=int, default=1_000)
+    args = parser.parse_args()
+
+    if args.command == "reconcile-votes":
+        with Session(engine) as session:
+            repaired = reconcile_votes(session)
+        print(f"Repaired vote counts of {len(repaired)} post(s): {repaired}")
+
+    elif args.command == "import-users":
+        with Session(engine) as session:
+            created, conflicts, invalid = import_users(session, args.path, args.batch_size)
+        print(f"Imported {created} user(s), {conflicts} conflict(s), {invalid} invalid line(s)")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,8 @@
+import os
+from typing import Literal
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from . import startup
 
 # As per Pydantic version 1
 # class Settings(BaseSettings):
@@ -31,9 +35,92 @@ class Settings(BaseSettings):
     algorithm: str
     access_token_expire_minutes: int
 
+    # Async mode: when enabled, the app is served by the `async def` routers backed by an AsyncEngine/AsyncSession,
+    # so a request waiting on Postgres no longer holds one of the AnyIO threadpool slots.
+    async_mode: bool = False
+    async_database: str = "postgresql+asyncpg" # "dialect+driver" used for the async engine
+
+    # Engine / connection pool profile. The defaults are the production profile: SQL echo off, pre-ping on.
+    # Size the pool against the worker count: every worker process gets its own `db_pool_size + db_max_overflow` connections.
+    db_echo: bool = False
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0   # seconds to wait for a free pooled connection before giving up
+    db_pool_recycle: int = 1800     # seconds after which a connection is replaced (-1 disables recycling)
+    db_pool_pre_ping: bool = True   # test connections on checkout, so a restarted Postgres doesn't fail requests
+    db_connect_timeout: int = 10    # seconds to wait while establishing a new connection
+
+    # What a worker does with the schema on startup. "create_all" runs `SQLModel.metadata.create_all` (one catalog query
+    # per table, fine for development). "check" only reads the schema version stamped by `migrations/` and refuses to
+    # start if it is older than the code: the production mode, where the schema is managed by the migration scripts.
+    db_startup: Literal["create_all", "check"] = "create_all"
+    db_pool_warm: bool = True # open `db_pool_size` connections before taking traffic
+
+    # Read replicas (see `app/replicas.py`), e.g. DATABASE_REPLICA_URLS='["postgresql://u:p@replica1:5432/db"]'.
+    # Empty: every query goes to the primary. Replica engines use the same pool profile as the primary.
+    database_replica_urls: list[str] = []
+    replica_health_check_interval: float = 5.0 # seconds between replica health checks
+    replica_max_lag: float = 10.0              # seconds of replication lag after which a replica stops getting reads
+    replica_read_after_write_window: float = 5.0 # seconds during which a user's reads stay on the primary after a write
+
+    # How the `search` filter of GET /posts matches posts. "fulltext" uses the GIN-indexed tsvector over title and content,
+    # "substring" is the old `content ILIKE '%term%'` behaviour (a sequential scan over every post).
+    post_search_mode: Literal["fulltext", "substring"] = "fulltext"
+
+    # Authenticated-user cache (see `app/oauth2.py`). A deactivated or deleted user stops authenticating at the latest
+    # `user_cache_ttl` seconds later on the workers that didn't serve the change. `user_cache_size=0` disables the cache.
+    user_cache_size: int = 10_000
+    user_cache_ttl: float = 30.0
+
+    # Decoded-token cache (see `verify_access_token`). Entries live until the token's own `exp`. 0 disables the cache.
+    token_cache_size: int = 10_000
+
+    # Password hashing (see `app/utils.py`). Argon2id cost parameters, memory in KiB (defaults: OWASP's minimum recommendation).
+    argon2_time_cost: int = 2
+    argon2_memory_cost: int = 19_456
+    argon2_parallelism: int = 1
+    # Size of the hashing thread pool (one per core by default), and how many more hashes may wait for it before we return 503.
+    password_hash_workers: int = Field(default_factory=lambda: os.cpu_count() or 1)
+    password_hash_queue: int = 64
+
+    # Cache of serialized post responses (see `app/http_cache.py`), per process. 0 disables it, ETags keep working.
+    response_cache_size: int = 1_000
+    response_cache_ttl: float = 10.0
+
+    # Write-behind votes (see `app/vote_buffer.py`): POST /vote answers 202 and votes are written in batches.
+    vote_write_behind: bool = False
+    vote_buffer_max_pending: int = 100_000 # distinct (user, post) votes held in memory before new votes get a 503
+    vote_buffer_flush_size: int = 1_000
+    vote_buffer_flush_interval: float = 0.5 # seconds
+
+    # Fail requests that run more SQL statements than their budget in `app/query_budget.py`. Meant for dev/CI runs.
+    enforce_query_budgets: bool = False
+
+    # Admission control and load shedding (see `app/admission.py`), per worker process. Concurrency limits are per route
+    # group; keep their sum below the threadpool size (40 by default) so that other routes always get a thread.
+    admission_control: bool = False
+    admission_limits: dict[str, int] = {"login": 4, "vote": 10, "posts": 16, "user": 4} # 34 threads, 6 left for the rest
+    admission_max_queue: int = 32         # requests per group waiting for a slot, beyond that: 503
+    admission_queue_timeout: float = 2.0  # seconds a request may wait for a slot before a 503
+    rate_limit_per_second: float = 20.0   # per user (or client address) token bucket, 0 disables rate limiting
+    rate_limit_burst: int = 40
+
+    # Per-route request/SQL metrics, exported in the Prometheus format on `/metrics` (see `app/metrics.py`)
+    metrics_enabled: bool = True
+
+    # GET /posts/export: rows fetched per round trip from the server-side cursor, and written per chunk of the stream
+    export_batch_size: int = 1_000
+
+    # `X-Total-Count` of GET /posts and GET /user (see `app/counts.py`): "exact" counts on every request, "cached" keeps
+    # the count `total_count_cache_ttl` seconds per filter, "estimate" reads the planner's table row estimate.
+    total_count_mode: Literal["off", "exact", "cached", "estimate"] = "cached"
+    total_count_cache_ttl: float = 30.0
+
     model_config = SettingsConfigDict(
         env_file=".env",
         case_sensitive=False,
     )
 
+startup.record("imports")
 settings = Settings()
+startup.record("settings")
@@ -0,0 +1,70 @@
+from typing import Hashable
+from sqlalchemy import Table, func, text
+from sqlmodel import Session, select
+from .cache import TTLCache
+from .config import settings
+from .models import Post, User
+
+# Total counts for the paginated listings, sent in the `X-Total-Count` header of GET /posts and GET /user.
+#
+# A `COUNT(*)` reads every matching row, so on a large table it costs more than the page itself. It is also never run
+# over the listing query (owner join, ordering, pagination): only the filters are kept. `Settings.total_count_mode`:
+#
+# - "exact": one `count(*)` per request.
+# - "cached": the same count, kept `total_count_cache_ttl` seconds per (table, filters). Creating or deleting a post or
+#   a user drops the entries of that table in this process; other workers are off for at most the TTL.
+# - "estimate": the planner's row count of the table (`pg_class.reltuples`, scaled to the table's current size the way
+#   the planner does it), a catalog lookup that doesn't depend on the table size. It only exists for a whole table, so a
+#   filtered listing (owner, search), or a table that was never analyzed, gets the cached count instead.
+# - "off": no header.
+
+ESTIMATE_SQL = text("""
+    SELECT CASE
+        WHEN reltuples < 0 OR relpages = 0 THEN NULL
+        ELSE round(reltuples / relpages * (pg_relation_size(oid) / current_setting('block_size')::int))::bigint
+    END
+    FROM pg_class
+    WHERE oid = to_regclass(quote_ident(:table))
+""")
+
+post_count_cache = TTLCache("post_counts", maxsize=10_000, ttl=settings.total_count_cache_ttl)
+user_count_cache = TTLCache("user_counts", maxsize=1, ttl=settings.total_count_cache_ttl)
+
+def invalidate_post_counts():
+    post_count_cache.clear()
+
+def invalidate_user_counts():
+    user_count_cache.clear()
+
+def _exact_count(session: Session, table: Table, filters: tuple) -> int:
+    return session.exec(select(func.count()).select_from(table).where(*filters)).one()
+
+def _cached_count(session: Session, table: Table, filters: tuple, cache: TTLCache, key: Hashable) -> int:
+    count = cache.get(key)
+    if count is None:
+        count = _exact_count(session, table, filters)
+        cache.set(key, count)
+    return count
+
+def total_count(session: Session, table: Table, filters: tuple, cache: TTLCache, key: Hashable) -> int | None:
+    # `filters` are the WHERE clauses of the listing, `key` identifies them in `cache`
+    mode = settings.total_count_mode
+    if mode == "off":
+        return None
+    if mode == "exact":
+        return _exact_count(session, table, filters)
+    if mode == "estimate" and not filters:
+        estimate = session.exec(ESTIMATE_SQL.bindparams(table=table.name)).scalar_one_or_none()
+        if estimate is not None:
+            return estimate
+    return _cached_count(session, table, filters, cache, key)
+
+def with_total_count(headers: dict, total: int | None) -> dict:
+    # A copy: `headers` may be the dict held by the response cache
+    return headers if total is None else {**headers, "X-Total-Count": str(total)}
+
+def post_total_count(session: Session, filters: tuple, key: Hashable) -> int | None:
+    return total_count(session, Post.__table__, filters, post_count_cache, key)
+
+def user_total_count(session: Session) -> int | None:
+    return total_count(session, User.__table__, (), user_count_cache, None)
@@ -0,0 +1,55 @@
+import hashlib
+from fastapi import Request, Response, status
+from .cache import TTLCache
+from .config import settings
+from .serialization import join_fragments, complete_fragment
+
+# HTTP caching for post reads: strong ETags, `If-None-Match` -> 304, and an in-process cache of the serialized responses.
+#
+# The ETag of a post is derived from its `version` (bumped whenever its JSON representation changes, see `Post.version`)
+# and its vote count, so it can be computed without serializing anything. A listing's ETag combines those of its posts.
+# The caches hold `(etag, body, headers)`, so a cache hit costs neither a query nor a serialization. Responses with the
+# per-user `liked_by_me` flag hold `(state, fragments, headers)` instead, completed per request by `viewer_response`.
+# Writes invalidate the entries in this process; other workers serve at most `response_cache_ttl` seconds of stale data.
+
+post_response_cache = TTLCache("post_responses", maxsize=settings.response_cache_size, ttl=settings.response_cache_ttl)
+post_list_response_cache = TTLCache("post_list_responses", maxsize=settings.response_cache_size, ttl=settings.response_cache_ttl)
+
+def post_etag(*posts: tuple[int, int, int], variant: str = "") -> str:
+    # `posts` are (id, version, votes) tuples. `variant` tells apart other representations of the same posts (e.g. a
+    # sparse fieldset), which must not share the ETag of the full one.
+    state = ",".join(f"{post_id}:{version}:{votes}" for post_id, version, votes in posts)
+    if variant:
+        state = f"{variant}|{state}"
+    return '"' + hashlib.sha256(state.encode()).hexdigest()[:32] + '"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    # `If-None-Match` uses the weak comparison: a `W/` prefix sent back by an intermediary still matches
+    return if_none_match.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+def conditional_response(request: Request, etag: str, body: bytes, headers: dict | None = None) -> Response:
+    headers = {**(headers or {}), "ETag": etag}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def invalidate_post(post_id: int | None = None):
+    # A post changed (or was created/deleted): its own entry is stale, and any listing may contain it.
+    if post_id is not None:
+        post_response_cache.invalidate(post_id)
+    post_list_response_cache.clear()
+
+def invalidate_all_posts():
+    post_response_cache.clear()
+    post_list_response_cache.clear()
+
+def viewer_response(request: Request, state: tuple, fragments: list[bytes], liked: set[int], headers: dict | None = None, variant: str = "", many: bool = True) -> Response:
+    # `state` holds the (id, version, votes) tuples of the posts, in the order of `fragments`. The user's flags are part
+    # of the ETag: liking a post changes that user's representation only.
+    flags = [post_id in liked for post_id, _, _ in state]
+    etag = post_etag(*state, variant=f"{variant}|liked:{''.join('1' if flag else '0' for flag in flags)}")
+    body = join_fragments(fragments, flags) if many else complete_fragment(fragments[0], flags[0])
+    return conditional_response(request, etag, body, headers)
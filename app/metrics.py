@@ -0,0 +1,134 @@
+import bisect
+import threading
+import time
+from .query_budget import count_queries
+from .pool import pool_stats
+from .cache import caches
+
+# Request metrics in the Prometheus text format, served on `/metrics` (see `app/routers/internal.py`).
+#
+# `MetricsMiddleware` records, per route template (`/posts/{post_id}`, not the raw path, so the number of series stays
+# bounded): the number of requests by status code, a latency histogram, and how many SQL statements the request ran and
+# how long they took (counted by the engine listeners of `app/query_budget.py`). Comparing the request latency with its
+# SQL time tells whether a slow endpoint is waiting on Postgres or spending its time in Python (validation, JWT, JSON).
+#
+# Recording is a few dict lookups and additions under a lock per request, cheap enough to stay on in production.
+# No client library is needed for an exposition format this small.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # the last one is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+class RequestMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: dict[tuple[str, str, int], int] = {}            # (method, route, status) -> count
+        self.latency: dict[tuple[str, str], Histogram] = {}            # (method, route) -> seconds
+        self.sql_queries: dict[tuple[str, str], Histogram] = {}        # (method, route) -> statements per request
+        self.sql_duration: dict[tuple[str, str], Histogram] = {}       # (method, route) -> SQL seconds per request
+
+    def record(self, method: str, route: str, status: int, duration: float, queries: int, sql_duration: float):
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.sql_queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+                self.sql_duration[key] = Histogram(LATENCY_BUCKETS)
+            self.latency[key].observe(duration)
+            self.sql_queries[key].observe(queries)
+            self.sql_duration[key].observe(sql_duration)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            lines.append("# HELP http_requests_total Requests by route and status code.")
+            lines.append("# TYPE http_requests_total counter")
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+            for name, description, histograms in (
+                ("http_request_duration_seconds", "Request latency.", self.latency),
+                ("http_request_sql_queries", "SQL statements run per request.", self.sql_queries),
+                ("http_request_sql_duration_seconds", "Time spent executing SQL per request.", self.sql_duration),
+            ):
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} histogram")
+                for (method, route), histogram in sorted(histograms.items()):
+                    cumulative = 0
+                    for bucket, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(method=method, route=route, le=bucket)} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(method=method, route=route)} {histogram.total}")
+                    lines.append(f"{name}_count{_labels(method=method, route=route)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+request_metrics = RequestMetrics()
+
+def _family(name: str, kind: str, samples) -> list[str]:
+    # One metric family: its TYPE line followed by all its samples, as the format requires
+    return [f"# TYPE {name} {kind}"] + [f"{name}{_labels(**labels)} {value}" for labels, value in samples]
+
+def render_metrics() -> str:
+    # Request metrics, plus the connection pool and cache counters that `/internal/pool` and `/internal/cache` expose
+    pools = {name: stats.snapshot() for name, stats in sorted(pool_stats.items())}
+    cache_stats = {name: cache.stats() for name, cache in sorted(caches.items())}
+    lines = [request_metrics.render().rstrip("\n")]
+    lines += _family("db_pool_checkouts_total", "counter", (({"pool": name}, pool["checkouts"]) for name, pool in pools.items()))
+    lines += _family("db_pool_timeouts_total", "counter", (({"pool": name}, pool["timeouts"]) for name, pool in pools.items()))
+    lines += _family("db_pool_wait_seconds_total", "counter", (({"pool": name}, pool["total_wait_ms"] / 1000) for name, pool in pools.items()))
+    for key in ("hits", "misses", "evictions"):
+        lines += _family(f"cache_{key}_total", "counter", (({"cache": name}, stats[key]) for name, stats in cache_stats.items()))
+    lines += _family("cache_size", "gauge", (({"cache": name}, stats["size"]) for name, stats in cache_stats.items()))
+    return "\n".join(lines) + "\n"
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    group = scope.get("admission_rejected_group")
+    return f"group:{group}" if group is not None else "unmatched"
+
+class MetricsMiddleware:
+    # Plain ASGI middleware, like `QueryBudgetMiddleware`. Requests that match no route are recorded as "unmatched",
+    # requests rejected by `AdmissionMiddleware` before routing as "group:<route group>".
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        with count_queries() as query_count:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                request_metrics.record(
+                    scope["method"],
+                    route_label(scope),
+                    status,
+                    time.perf_counter() - start,
+                    query_count.count,
+                    query_count.duration,
+                )
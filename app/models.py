@@ -1,7 +1,8 @@
 from datetime import datetime, timezone
 from pydantic import EmailStr, BaseModel
 from sqlmodel import Field, SQLModel, Relationship
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, text, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Double, text, ForeignKey, Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from typing import Optional, Literal
 
 ########################################### USER MODEL ###########################################
@@ -31,7 +32,9 @@ class User(BaseUser, table=True):
             server_default=text("TRUE"),
         )
     )
-    posts: list["Post"] = Relationship(back_populates="owner")
+    # The posts (and their votes) go with the user through `ON DELETE CASCADE`. "all": the ORM must not try to set
+    # `owner_id` to NULL on the posts it has loaded, the database deletes them.
+    posts: list["Post"] = Relationship(back_populates="owner", passive_deletes="all")
 
 class CreateUser(BaseUser):
     password: str = Field(nullable=False)
@@ -40,6 +43,16 @@ class ReadUser(BaseUser):
     id: int
     date_created: datetime
 
+class BulkUserItemResult(BaseModel):
+    username: str
+    status: Literal["created", "conflict"]
+    id: Optional[int] = None     # set when created
+    detail: Optional[str] = None # set on conflict
+
+class BulkUserResult(BaseModel):
+    created: int
+    results: list[BulkUserItemResult] # same order as the submitted users
+
 class UpdateUser(SQLModel):
     username: Optional[str] = None
     email: Optional[EmailStr] = None
@@ -86,6 +99,13 @@ class PostBase(SQLModel):
 
 # Note that only the Post class has table=True
 class Post(PostBase, table=True):
+    # Composite indexes backing the keyset pagination of GET /posts (see `app/pagination.py`).
+    # A B-tree can be read backwards, so they also serve the `DESC, DESC` ordering.
+    __table_args__ = (
+        Index("ix_post_created_at_id", "created_at", "id"),
+        Index("ix_post_votes_count_id", "votes_count", "id"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     # Using server-side default for created_at to ensure consistency across distributed systems and avoid timezone issues.
     created_at: datetime = Field(
@@ -97,8 +117,48 @@ class Post(PostBase, table=True):
         ),
     )
     owner_id: int = Field(sa_column = Column(Integer, ForeignKey("user.id", ondelete = "CASCADE"), nullable = False))
+    # Denormalized number of likes. It is kept up to date by the vote endpoint in the same transaction as the `Vote` row,
+    # so reads don't need a JOIN + GROUP BY over the vote table. `python -m app.cli reconcile-votes` repairs any drift.
+    votes_count: int = Field(default=0, sa_column=Column(Integer, nullable=False, server_default=text("0")))
+    # Incremented whenever the post's JSON representation changes (its own fields, or its owner's public profile).
+    # Together with `votes_count` it identifies a version of the response, which is what the post ETags are built from.
+    version: int = Field(default=1, sa_column=Column(Integer, nullable=False, server_default=text("1")))
+    # Precomputed beginning of `content` for list views (`GET /posts/?fields=...,excerpt`), so they don't have to fetch
+    # the full content. Set by `create_post`/`update_post` through `make_excerpt()` (see `app/projection.py`).
+    excerpt: str = Field(default="", sa_column=Column(String, nullable=False, server_default=text("''")))
     owner: User = Relationship(back_populates = "posts") # relationship fetches the user based on the `owner_id`. It doesn't affect the post table in any way.
 
+# Full-text search document of a post: title (weight A) + content (weight B), maintained by Postgres as a generated column
+# and served by a GIN index. It is added to the table but deliberately not mapped on the `Post` model, so that regular
+# post queries don't load the (large) tsvector. Search queries reference it as `post_search_vector`.
+post_search_vector = Column(
+    "search_vector",
+    TSVECTOR,
+    Computed(
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(content, '')), 'B')",
+        persisted=True,
+    ),
+)
+Post.__table__.append_column(post_search_vector)
+Index("ix_post_search_vector", post_search_vector, postgresql_using="gin")
+
+# "Hot" ranking score of GET /posts/hot: log10(votes) + age bonus, where every 45000 s (12.5 h) of newer creation time is
+# worth 10x the votes. The score doesn't depend on the current time (newer posts simply start higher), so it only changes
+# when `votes_count` changes: Postgres recomputes the generated column in the same UPDATE that counts the vote, and the
+# (hot_score, id) index serves the top-K page directly. Unmapped, like `post_search_vector`.
+post_hot_score = Column(
+    "hot_score",
+    Double,
+    Computed(
+        "(log(greatest(votes_count, 1)::double precision) + "
+        "extract(epoch FROM created_at - timestamptz '2024-01-01 00:00:00+00') / 45000)::double precision",
+        persisted=True,
+    ),
+)
+Post.__table__.append_column(post_hot_score)
+Index("ix_post_hot_score_id", post_hot_score, Post.__table__.c.id)
+
 # SQLModel defining the output schema for GET API
 class PostPublic(PostBase):
     id: int
@@ -111,6 +171,10 @@ class PostWithVote(BaseModel):
     class Config:
         orm_mode = True  # Important! Allows FastAPI to serialize SQLModel objects
 
+# GET /posts and GET /posts/{id}: also tells whether the authenticated user likes the post
+class PostWithViewerVote(PostWithVote):
+    liked_by_me: bool
+
 # SQLModel defining the input schema for CREATE API
 class PostCreate(PostBase):
     pass
@@ -139,4 +203,12 @@ class Vote(SQLModel, table=True):
 
 class VoteApiSchema(BaseModel):
     post_id: int
-    vote_dir: Literal[0, 1] # Like:1 | Unlike:0
\ No newline at end of file
+    vote_dir: Literal[0, 1] # Like:1 | Unlike:0
+
+class VoteBatchItemResult(BaseModel):
+    post_id: int
+    vote_dir: Literal[0, 1]
+    status: Literal["liked", "unliked", "already_liked", "not_liked", "post_not_found", "superseded", "accepted"]
+
+class VoteBatchResult(BaseModel):
+    results: list[VoteBatchItemResult] # same order as the submitted votes
\ No newline at end of file
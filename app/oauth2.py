@@ -1,4 +1,6 @@
 from datetime import datetime, timedelta, timezone
+import hashlib
+import time
 from typing import Annotated
 import jwt
 from fastapi import Depends, FastAPI, HTTPException, status
@@ -7,8 +9,9 @@ from fastapi.security import OAuth2PasswordBearer
 from pwdlib import PasswordHash
 from pydantic import BaseModel
 from .models import User, TokenData, Token
-from .database import SessionDep
+from .database import SessionDep, AsyncSessionDep
 from .config import settings
+from .cache import TTLCache
 from sqlmodel import select
 
 # to get a string like this run:
@@ -48,7 +51,21 @@ def prepare_access_token(data: dict, expires_delta: timedelta | None = None):
 #     ↓
 # user_id extracted
 
+# Clients send the same bearer token on every request, so the result of `jwt.decode` (signature check included) is cached
+# per token until the token's `exp`. The key is a SHA-256 digest of the token, which keeps the entries small and the raw
+# tokens out of memory. Only successfully verified tokens are cached.
+token_cache = TTLCache("tokens", maxsize=settings.token_cache_size, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
 def verify_access_token(token: str, credentials_exception):
+    cache_key = hashlib.sha256(token.encode()).digest()
+    cached = token_cache.get(cache_key)
+    if cached is not None:
+        token_data, exp = cached
+        # Same rule as PyJWT's own check (`exp <= now` is expired, no leeway), so a cached token expires at exactly the same moment.
+        if exp is None or time.time() < exp:
+            return token_data
+        token_cache.invalidate(cache_key) # expired: fall through, so that jwt.decode raises as before
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("user_id")
@@ -61,6 +78,8 @@ def verify_access_token(token: str, credentials_exception):
     except InvalidTokenError:
         raise credentials_exception 
     
+    exp = payload.get("exp")
+    token_cache.set(cache_key, (token_data, exp), expires_at=None if exp is None else time.monotonic() + (exp - time.time()))
     return token_data
 
 # When we send an HTTP request, FastAPI does the following before the endpoint runs:
@@ -71,18 +90,54 @@ def verify_access_token(token: str, credentials_exception):
 # 4. Extracts the token string
 # 5. Injects it into the function. Internally, this happens: token = oauth2_scheme(request)
 
-def get_current_user(session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)],) -> User:
-
-    credentials_exception = HTTPException(
+def get_credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED, 
         detail="Could not validate credentials", 
         headers={"WWW-Authenticate": "Bearer"}, 
         )
+
+# Cache of authenticated (active) users, keyed by user id. It saves the `SELECT ... FROM user` round trip on every
+# authenticated request. The cached value is a detached copy of the row, not the instance of the request's session:
+# that one is expired as soon as the request commits, and could not be read from another request afterwards.
+# `update_user` and `delete_user` invalidate the entry, other workers pick up the change after `user_cache_ttl` seconds.
+user_cache = TTLCache("users", maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl)
+
+def cache_user(user: User) -> User:
+    cached_user = User.model_validate(user.model_dump())
+    user_cache.set(user.id, cached_user)
+    return cached_user
+
+def get_current_user(session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)],) -> User:
+
+    credentials_exception = get_credentials_exception()
     
     token_data = verify_access_token(token, credentials_exception)
+    user = user_cache.get(token_data.user_id)
+    if user is not None:
+        return user
+
     user = session.exec(select(User).where(User.id == token_data.user_id)).first()
 
-    if not user:
+    # A deactivated user can't authenticate anymore (and is never cached)
+    if not user or not user.is_active:
         raise credentials_exception
     
-    return user
\ No newline at end of file
+    return cache_user(user)
+
+# Async mode counterpart of `get_current_user`. Token verification is pure CPU work, only the user lookup awaits the database.
+async def get_current_user_async(session: AsyncSessionDep, token: Annotated[str, Depends(oauth2_scheme)],) -> User:
+
+    credentials_exception = get_credentials_exception()
+
+    token_data = verify_access_token(token, credentials_exception)
+    user = user_cache.get(token_data.user_id)
+    if user is not None:
+        return user
+
+    user = (await session.exec(select(User).where(User.id == token_data.user_id))).first()
+
+    if not user or not user.is_active:
+        raise credentials_exception
+
+    return cache_user(user)
@@ -2,22 +2,71 @@ from typing import Annotated
 from fastapi.concurrency import asynccontextmanager
 from fastapi import FastAPI, status, Response, HTTPException, Depends, Query
 from sqlmodel import Session, select
-from .database import create_db_and_tables, SessionDep
+from .database import create_db_and_tables, check_schema_version, warm_pool, warm_async_pool, SessionDep, engine, async_engine, async_replica_engines
+from .config import settings
 from .models import *
-from .routers import post, user, auth, vote
+from .routers import post, user, auth, vote, internal
+from .query_budget import QueryBudgetMiddleware
+from .metrics import MetricsMiddleware
+from .admission import AdmissionMiddleware
+from .replicas import replica_set
+from . import startup
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Starting up...")
-    create_db_and_tables()
+    startup.record("server start")
+    # The schema check (or create_all) opens the first connection
+    if settings.db_startup == "check":
+        check_schema_version()
+    else:
+        create_db_and_tables()
+    startup.record("first connection")
+    if settings.db_pool_warm:
+        # Only the engine that serves the requests: in async mode the sync engine is left to the vote flush and the
+        # readiness probe, which open connections as they need them
+        if async_engine is not None:
+            await warm_async_pool(async_engine)
+        else:
+            warm_pool(engine)
+        startup.record("pool warm-up")
+    if settings.vote_write_behind:
+        vote.vote_buffer.start()
+    if replica_set.engines:
+        replica_set.start()
+        startup.record("replica check")
+    startup.ready = True
+    print(startup.summary())
     yield
+    # The lifespan shutdown only runs once uvicorn has drained its connections. `python -m app.server` already failed
+    # readiness when the SIGTERM arrived (see `Server.handle_exit` in `app/server.py`), before the drain.
+    startup.ready = False
+    # Votes still in the write-behind buffer are written before the worker exits
+    if settings.vote_write_behind:
+        vote.vote_buffer.stop()
+    replica_set.stop()
+    if async_engine is not None:
+        await async_engine.dispose()
+    for replica in async_replica_engines:
+        await replica.dispose()
 
 app = FastAPI(lifespan = lifespan)
+startup.record("app imports")
 
-app.include_router(post.router)
-app.include_router(user.router)
-app.include_router(auth.router)
-app.include_router(vote.router)
+if settings.enforce_query_budgets:
+    app.add_middleware(QueryBudgetMiddleware)
+if settings.admission_control:
+    app.add_middleware(AdmissionMiddleware)
+# Added last, so it is the outermost middleware and its latency covers the other ones
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+# `settings.async_mode` picks between the sync (threadpool) routers and their `async def` counterparts.
+for module in (post, user, auth, vote):
+    app.include_router(module.async_router if settings.async_mode else module.router)
+app.include_router(internal.router)
+app.include_router(internal.metrics_router)
+app.include_router(internal.health_router)
 
 @app.get("/")
 def root():
@@ -0,0 +1,84 @@
+import base64
+import json
+from datetime import datetime
+from typing import Literal
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+from .models import Post
+
+# Keyset (cursor) pagination for post listings.
+# With `offset`, page N makes Postgres produce and throw away N*limit rows. With a cursor, the client sends back the sort key
+# of the last row it has seen, and the next page starts right after it: `WHERE (created_at, id) < (:created_at, :id)`.
+# With the matching composite index every page is a short index range scan, no matter how deep it is.
+
+PostSort = Literal["new", "top"]
+
+# Sort key columns per sort order. `id` is always the tie-breaker, so that the key is unique and no row is skipped or repeated.
+SORT_COLUMNS = {
+    "new": (Post.created_at, Post.id),
+    "top": (Post.votes_count, Post.id),
+}
+
+def order_by_sort(select_stmt, sort: PostSort):
+    return select_stmt.order_by(*(column.desc() for column in SORT_COLUMNS[sort]))
+
+def _encode_token(data: dict) -> str:
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_token(cursor: str) -> dict:
+    return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+
+def encode_cursor(sort: PostSort, post: Post) -> str:
+    key = [post.created_at.isoformat(), post.id] if sort == "new" else [post.votes_count, post.id]
+    return _encode_token({"s": sort, "k": key})
+
+def decode_cursor(cursor: str, sort: PostSort) -> tuple:
+    # The token is opaque to clients. Anything we cannot decode (or a cursor from another sort order) is a client error.
+    invalid_cursor = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+    try:
+        data = _decode_token(cursor)
+        first, post_id = data["k"]
+        if data["s"] != sort:
+            raise invalid_cursor
+        key = (datetime.fromisoformat(first) if sort == "new" else int(first), int(post_id))
+    except (ValueError, KeyError, TypeError):
+        raise invalid_cursor
+    return key
+
+def apply_cursor(select_stmt, cursor: str, sort: PostSort):
+    # Row-value comparison, served by the composite (sort key, id) index.
+    return select_stmt.where(tuple_(*SORT_COLUMNS[sort]) < decode_cursor(cursor, sort))
+
+# Search results are ordered by relevance, so their cursor is `(rank, id)` of the last row. The rank only has a meaning
+# for one query, so the query text is part of the token and a cursor can't be replayed against another search.
+def encode_search_cursor(query: str, rank: float, post_id: int) -> str:
+    return _encode_token({"q": query, "k": [rank, post_id]})
+
+def decode_search_cursor(cursor: str, query: str) -> tuple[float, int]:
+    invalid_cursor = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+    try:
+        data = _decode_token(cursor)
+        rank, post_id = data["k"]
+        if data["q"] != query:
+            raise invalid_cursor
+        key = (float(rank), int(post_id))
+    except (ValueError, KeyError, TypeError):
+        raise invalid_cursor
+    return key
+
+# GET /posts/hot is ordered by `(hot_score, id)`. The score is a float8, and JSON round-trips it exactly.
+def encode_hot_cursor(hot_score: float, post_id: int) -> str:
+    return _encode_token({"s": "hot", "k": [hot_score, post_id]})
+
+def decode_hot_cursor(cursor: str) -> tuple[float, int]:
+    invalid_cursor = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+    try:
+        data = _decode_token(cursor)
+        hot_score, post_id = data["k"]
+        if data["s"] != "hot":
+            raise invalid_cursor
+        key = (float(hot_score), int(post_id))
+    except (ValueError, KeyError, TypeError):
+        raise invalid_cursor
+    return key
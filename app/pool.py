@@ -0,0 +1,71 @@
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+# Connection pool telemetry.
+# SQLAlchemy's QueuePool already knows how many connections are checked out / in overflow, but not how long a request
+# had to wait for a connection, or how often it gave up (`pool_timeout`). These two numbers are what tells us whether
+# `pool_size + max_overflow` is too small for the number of workers/threads we run.
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0 # seconds
+        self.max_wait = 0.0   # seconds
+
+    def record_checkout(self, wait: float):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def record_timeout(self, wait: float):
+        with self._lock:
+            self.timeouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "total_wait_ms": round(self.total_wait * 1000, 3),
+                "avg_wait_ms": round(self.total_wait * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+# Stats are keyed by the pool's logging name (`pool_logging_name` in create_engine) instead of being stored on the pool,
+# because `engine.dispose()` replaces the pool object with a fresh one and the counters should survive that.
+pool_stats: dict[str, PoolStats] = {}
+
+class InstrumentedPoolMixin:
+    def _do_get(self):
+        stats = pool_stats.setdefault(self._orig_logging_name or "default", PoolStats())
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            stats.record_timeout(time.perf_counter() - start)
+            raise
+        stats.record_checkout(time.perf_counter() - start)
+        return connection
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+def get_pool_status(engine) -> dict:
+    pool = engine.pool
+    return {
+        "pool_size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0), # QueuePool counts from -pool_size, we only want connections above pool_size
+        **pool_stats.setdefault(pool._orig_logging_name or "default", PoolStats()).snapshot(),
+    }
@@ -0,0 +1,55 @@
+from fastapi import HTTPException, status
+from sqlmodel import select
+from .models import Post, User
+from .serialization import OWNER_FIELDS, viewer_fragment
+
+# Sparse fieldsets for post listings (`GET /posts/?fields=id,title,excerpt`).
+# List views rarely need the full `content` or the embedded owner. With `fields`, only the requested columns are
+# selected (plain columns, no ORM entities), the owner is joined only when asked for, and the response keeps the
+# `{"post": {...}, "votes": n}` shape with just the requested keys, in their usual order.
+
+EXCERPT_LENGTH = 200
+
+def make_excerpt(content: str) -> str:
+    # Keep in sync with the back-fill in migrations/005_post_excerpt.sql
+    if len(content) <= EXCERPT_LENGTH:
+        return content
+    return content[:EXCERPT_LENGTH - 1] + "…"
+
+# Selectable keys, in response order: the PostPublic fields, with `excerpt` right after `content`.
+SPARSE_FIELDS = ("title", "content", "excerpt", "published", "id", "owner_id", "owner")
+
+def parse_fields(fields: str | None) -> tuple[str, ...] | None:
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(SPARSE_FIELDS)
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid `fields`. Allowed values: {', '.join(SPARSE_FIELDS)}.",
+        )
+    return tuple(name for name in SPARSE_FIELDS if name in requested)
+
+def sparse_post_select(fields: tuple[str, ...]):
+    # `id`, `version`, `created_at` and `votes_count` are always selected: they are needed for the cursor and the ETag.
+    columns = [Post.id, Post.version, Post.created_at, Post.votes_count, Post.votes_count.label("votes")]
+    columns += [getattr(Post, name) for name in fields if name not in ("id", "owner")]
+    select_stmt = select(*columns)
+    if "owner" in fields:
+        columns = [getattr(User, name).label(f"owner__{name}") for name in OWNER_FIELDS]
+        select_stmt = select_stmt.add_columns(*columns).join(User, User.id == Post.owner_id)
+    return select_stmt
+
+def sparse_post_dict(row, fields: tuple[str, ...]) -> dict:
+    post = {}
+    for name in fields:
+        if name == "owner":
+            post["owner"] = {owner_field: getattr(row, f"owner__{owner_field}") for owner_field in OWNER_FIELDS}
+        else:
+            post[name] = getattr(row, name)
+    return post
+
+def sparse_post_fragment(row, votes: int, fields: tuple[str, ...]) -> bytes:
+    # See `viewer_fragment` in `app/serialization.py`, `liked_by_me` is added per request
+    return viewer_fragment({"post": sparse_post_dict(row, fields), "votes": votes})
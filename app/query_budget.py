@@ -0,0 +1,102 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# SQL statement counting and timing, per request (or per `with` block).
+#
+# A `before_cursor_execute` listener on every Engine (sync engines, and the sync side of the async engine) increments
+# the counter of the current context, and `after_cursor_execute` adds the statement's execution time. The counter lives in a ContextVar: FastAPI copies the context into the threadpool
+# thread of a sync endpoint (and `run_sync` keeps it in async mode), so concurrent requests never mix their counts.
+#
+# Used to keep N+1 query patterns from coming back: every endpoint in QUERY_BUDGETS has a maximum number of statements,
+# and with `Settings.enforce_query_budgets` on (dev/CI) a request that goes over it fails with QueryBudgetExceeded.
+# In a test (see tests/test_query_budgets.py):
+#
+#   with query_budget(QUERY_BUDGETS["GET /posts/"]):
+#       await client.get("/posts/", params={"limit": 100}, headers=auth_headers)
+
+@dataclass
+class QueryCount:
+    count: int = 0
+    duration: float = 0.0 # seconds spent executing the statements
+    statements: list[str] = field(default_factory=list)
+    parent: "QueryCount | None" = None # enclosing block, which counts the same statements
+
+_current_count: ContextVar[QueryCount | None] = ContextVar("query_count", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    query_count = _current_count.get()
+    if query_count is not None:
+        conn.info["query_started"] = time.perf_counter()
+    while query_count is not None:
+        query_count.count += 1
+        query_count.statements.append(statement)
+        query_count = query_count.parent
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _time_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_started", None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+    query_count = _current_count.get()
+    while query_count is not None:
+        query_count.duration += duration
+        query_count = query_count.parent
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+@contextmanager
+def count_queries():
+    query_count = QueryCount(parent=_current_count.get())
+    token = _current_count.set(query_count)
+    try:
+        yield query_count
+    finally:
+        _current_count.reset(token)
+
+@contextmanager
+def query_budget(budget: int, label: str = "block"):
+    with count_queries() as query_count:
+        yield query_count
+    if query_count.count > budget:
+        raise QueryBudgetExceeded(
+            f"{label} ran {query_count.count} SQL statements, budget is {budget}:\n" + "\n".join(query_count.statements)
+        )
+
+# Statement budgets per endpoint ("METHOD path template"). They include the authentication lookup (when the user cache
+# misses), so e.g. a post listing is 1 (user) + 1 (posts with their owners) + 1 (`liked_by_me` and own pending votes)
+# + 1 (the `X-Total-Count`, when not cached). A listing that lazily loads owners row by row costs 1 + page size
+# statements and fails immediately.
+QUERY_BUDGETS = {
+    "GET /posts/": 4,
+    "GET /posts/search": 2,
+    "GET /posts/hot": 3,
+    "GET /posts/{post_id}": 3,
+    "GET /user/": 3,
+    "GET /user/{user_id}": 1,
+}
+
+class QueryBudgetMiddleware:
+    # Plain ASGI middleware (no BaseHTTPMiddleware task/queue overhead). The route is only known after routing, which
+    # FastAPI records in `scope["route"]`, so the budget is checked once the endpoint has run.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        with count_queries() as query_count:
+            await self.app(scope, receive, send)
+        route = scope.get("route")
+        key = f"{scope['method']} {route.path}" if route is not None else None
+        budget = QUERY_BUDGETS.get(key)
+        if budget is not None and query_count.count > budget:
+            raise QueryBudgetExceeded(
+                f"{key} ran {query_count.count} SQL statements, budget is {budget}:\n" + "\n".join(query_count.statements)
+            )
@@ -0,0 +1,137 @@
+import itertools
+import threading
+from typing import Annotated
+from fastapi import Depends
+from sqlalchemy import text
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from .cache import TTLCache
+from .config import settings
+from .database import engine, async_engine, replica_engines, async_replica_engines, SessionDep, AsyncSessionDep
+from .models import User
+from .oauth2 import get_current_user, get_current_user_async
+
+# Read-replica routing.
+#
+# `SessionDep` always talks to the primary. Read-only endpoints take `ReadSessionDep` instead, which is bound to one of
+# the replicas of `Settings.database_replica_urls`, picked round-robin among the healthy ones:
+#
+# - Health: a background thread checks every replica each `replica_health_check_interval` seconds. A replica that can't
+#   be reached, or that lags more than `replica_max_lag` seconds behind the primary, gets no reads until it recovers.
+#   With no healthy replica (or none configured) reads go to the primary.
+# - Read-after-write: a user who wrote something (`record_write`) reads from the primary for the next
+#   `replica_read_after_write_window` seconds, so they see their own post/vote even if the replicas are behind. Within
+#   a request, writes and the reads that follow them use the same `SessionDep` session, on the primary.
+# - Lag-sensitive endpoints simply keep using `SessionDep`.
+#
+# Other users can see a replica's data up to `replica_max_lag` seconds old, and a response cached from it (see
+# `app/http_cache.py`) for up to `response_cache_ttl` seconds more.
+
+LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+class ReplicaSet:
+    def __init__(self, engines: list, async_engines: list, check_interval: float, max_lag: float):
+        self.engines = engines
+        self.async_engines = async_engines
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.healthy: list[int] = []  # indexes of the replicas that currently get reads
+        self.status: dict[int, dict] = {}
+        self._counter = itertools.count()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def check(self):
+        healthy = []
+        for index, replica in enumerate(self.engines):
+            try:
+                with replica.connect() as connection:
+                    lag = float(connection.execute(LAG_SQL).scalar_one())
+            except Exception as e:
+                self.status[index] = {"healthy": False, "error": str(e)}
+                continue
+            self.status[index] = {"healthy": lag <= self.max_lag, "lag_seconds": round(lag, 3)}
+            if lag <= self.max_lag:
+                healthy.append(index)
+        self.healthy = healthy # swapped in one assignment, readers never see a half-built list
+
+    def pick(self) -> int | None:
+        healthy = self.healthy
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def engine(self):
+        index = self.pick()
+        return engine if index is None else self.engines[index]
+
+    def async_engine(self):
+        index = self.pick()
+        return async_engine if index is None else self.async_engines[index]
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            self.check()
+
+    def start(self):
+        # The first check runs before the app takes traffic, so reads don't start on a replica that is down
+        self.check()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-health", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+replica_set = ReplicaSet(
+    replica_engines,
+    async_replica_engines,
+    check_interval=settings.replica_health_check_interval,
+    max_lag=settings.replica_max_lag,
+)
+
+# Users who wrote recently, their reads stay on the primary
+recent_writers = TTLCache("recent_writers", maxsize=100_000, ttl=settings.replica_read_after_write_window)
+
+def record_write(user_id: int):
+    if replica_set.engines:
+        recent_writers.set(user_id, True)
+
+def _reads_from_primary(user_id: int) -> bool:
+    return not replica_set.healthy or recent_writers.get(user_id) is not None
+
+def read_engine(user_id: int):
+    return engine if _reads_from_primary(user_id) else replica_set.engine()
+
+def read_async_engine(user_id: int):
+    return async_engine if _reads_from_primary(user_id) else replica_set.async_engine()
+
+# `get_current_user` is already a dependency of the read endpoints, FastAPI resolves it once per request. So is the
+# request's primary session (`SessionDep`, used by the authentication lookup): reads that go to the primary reuse it
+# instead of holding a second pooled connection.
+def get_read_session(session: SessionDep, current_user: Annotated[User, Depends(get_current_user)]):
+    bind = read_engine(current_user.id)
+    if bind is engine:
+        yield session
+        return
+    with Session(bind) as replica_session:
+        yield replica_session
+
+async def get_async_read_session(session: AsyncSessionDep, current_user: Annotated[User, Depends(get_current_user_async)]):
+    bind = read_async_engine(current_user.id)
+    if bind is async_engine:
+        yield session
+        return
+    async with AsyncSession(bind, expire_on_commit=False) as replica_session:
+        yield replica_session
+
+ReadSessionDep = Annotated[Session, Depends(get_read_session)]
+AsyncReadSessionDep = Annotated[AsyncSession, Depends(get_async_read_session)]
@@ -3,12 +3,13 @@ from fastapi import APIRouter, HTTPException,status, Depends, FastAPI
 from psycopg2 import IntegrityError
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from ..models import User, LoginUser, Token
-from ..database import SessionDep
+from ..database import SessionDep, AsyncSessionDep
 from .. import utils, oauth2
 from sqlmodel import select
 
 
 router = APIRouter(tags=["Login"])
+async_router = APIRouter(tags=["Login"])
 
 @router.post("/login", response_model=Token, status_code=status.HTTP_200_OK)
 def authenticate_user(session: SessionDep, user_credentials: OAuth2PasswordRequestForm = Depends(),):
@@ -18,9 +19,40 @@ def authenticate_user(session: SessionDep, user_credentials: OAuth2PasswordReque
     if not user_db:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Credentials", headers={"WWW-Authenticate": "Bearer"},)
     
-    if not utils.verify_password(user_credentials.password, user_db.hashed_password):
+    is_valid, new_hash = utils.verify_and_update_password(user_credentials.password, user_db.hashed_password)
+    if not is_valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Credentials", headers={"WWW-Authenticate": "Bearer"},)
+
+    # Rehash-on-login: the stored hash is a legacy SHA-256 digest or uses outdated Argon2 parameters
+    if new_hash:
+        user_db.hashed_password = new_hash
+        session.add(user_db)
+        session.commit()
     
     access_token = oauth2.prepare_access_token({"username": user_db.username, "user_id": user_db.id})
 
-    return {"access_token" : access_token, "token_type" : "bearer"}  
\ No newline at end of file
+    return {"access_token" : access_token, "token_type" : "bearer"}
+
+
+# Async mode. Unlike the other async endpoints this one doesn't reuse the sync handler through `run_sync`: password
+# verification is awaited on the hashing pool, and that can't be done from inside the sync handler.
+@async_router.post("/login", response_model=Token, status_code=status.HTTP_200_OK)
+async def authenticate_user_async(session: AsyncSessionDep, user_credentials: OAuth2PasswordRequestForm = Depends(),):
+
+    user_db = (await session.exec(select(User).where(User.email == user_credentials.username))).first()
+
+    if not user_db:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Credentials", headers={"WWW-Authenticate": "Bearer"},)
+
+    is_valid, new_hash = await utils.verify_and_update_password_async(user_credentials.password, user_db.hashed_password)
+    if not is_valid:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Credentials", headers={"WWW-Authenticate": "Bearer"},)
+
+    if new_hash:
+        user_db.hashed_password = new_hash
+        session.add(user_db)
+        await session.commit()
+
+    access_token = oauth2.prepare_access_token({"username": user_db.username, "user_id": user_db.id})
+
+    return {"access_token" : access_token, "token_type" : "bearer"}
@@ -0,0 +1,58 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse, JSONResponse
+from sqlalchemy import text
+from ..database import engine, async_engine, replica_engines
+from ..replicas import replica_set
+from ..pool import get_pool_status
+from ..cache import caches
+from ..metrics import render_metrics
+from ..admission import limiters
+from .. import startup
+
+# Operational endpoints. They are kept out of the OpenAPI schema, and are meant to be reachable from inside the
+# deployment only (block `/internal` at the proxy).
+router = APIRouter(prefix="/internal", tags=["Internal"], include_in_schema=False)
+
+@router.get("/pool")
+def pool_status():
+    pools = {"primary": get_pool_status(engine)}
+    if async_engine is not None:
+        pools["async"] = get_pool_status(async_engine.sync_engine)
+    for index, replica in enumerate(replica_engines):
+        pools[f"replica{index}"] = {**get_pool_status(replica), **replica_set.status.get(index, {})}
+    return pools
+
+@router.get("/cache")
+def cache_status():
+    return {name: cache.stats() for name, cache in caches.items()}
+
+@router.get("/admission")
+def admission_status():
+    return {group: limiter.stats() for group, limiter in limiters.items()}
+
+# Prometheus scrape endpoint. It is at the conventional `/metrics` path, outside of the `/internal` prefix, but should
+# be blocked at the proxy in the same way.
+metrics_router = APIRouter(include_in_schema=False)
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Probes for the orchestrator. Liveness: the process answers (no database access, so a database outage doesn't get
+# every worker restarted). Readiness: startup is complete and the database answers.
+health_router = APIRouter(prefix="/health", include_in_schema=False)
+
+@health_router.get("/live")
+def liveness():
+    return {"status": "ok"}
+
+@health_router.get("/ready")
+def readiness():
+    if not startup.ready:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "database unavailable", "detail": str(e)})
+    return {"status": "ready", "startup_ms": {phase: round(seconds * 1000, 1) for phase, seconds in startup.timings.items()}}
@@ -1,14 +1,27 @@
+from datetime import datetime
 from typing import Annotated, Optional, List
-from fastapi import APIRouter, HTTPException, Query, status
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.params import Depends
-from ..models import Post, Vote, PostPublic, PostWithVote, PostBase, PostCreate, PostUpdate, User
-from ..oauth2 import get_current_user
-from ..database import SessionDep
+from ..models import Post, Vote, PostPublic, PostWithVote, PostWithViewerVote, PostBase, PostCreate, PostUpdate, User, post_hot_score
+from ..oauth2 import get_current_user, get_current_user_async
+from ..database import SessionDep, AsyncSessionDep
+from ..replicas import ReadSessionDep, AsyncReadSessionDep, read_engine, read_async_engine, record_write
+from ..pagination import PostSort, order_by_sort, apply_cursor, encode_cursor, encode_search_cursor, encode_hot_cursor, decode_hot_cursor
+from ..search import fulltext_match, fulltext_rank, apply_search_cursor
+from ..config import settings
+from .vote import vote_buffer, pending_vote_deltas, viewer_votes
+from ..serialization import dump_posts_with_votes, post_with_votes_fragment, dump_export_rows
+from ..projection import make_excerpt, parse_fields, sparse_post_select, sparse_post_fragment
+from ..http_cache import post_response_cache, post_list_response_cache, post_etag, conditional_response, viewer_response, invalidate_post
+from ..counts import post_total_count, with_total_count, invalidate_post_counts
 from sqlmodel import Session, select
-from sqlalchemy import func
-from sqlalchemy.orm import selectinload
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import selectinload, joinedload
 
 router = APIRouter(prefix="/posts", tags=["Post"])
+async_router = APIRouter(prefix="/posts", tags=["Post"])
 
 @router.post("/", response_model=PostPublic, status_code = status.HTTP_201_CREATED)
 def create_post(session: SessionDep, current_user: Annotated[User, Depends(get_current_user)], post: PostCreate, ):
@@ -17,25 +30,58 @@ def create_post(session: SessionDep, current_user: Annotated[User, Depends(get_c
         db_post = Post(
                 **post.model_dump(),
                 owner_id=current_user.id,
+                excerpt=make_excerpt(post.content),
             )
         # db_post = Post.model_validate(post)
         session.add(db_post)
         session.commit()
+        invalidate_post()
+        invalidate_post_counts()
+        record_write(current_user.id)
         session.refresh(db_post)
         return db_post
     except Exception as e:
         raise HTTPException(status_code = status.HTTP_500_INTERNAL_SERVER_ERROR, detail = str(e))
 
 
-@router.get("/", response_model=List[PostWithVote]) #
+@router.get("/", response_model=List[PostWithViewerVote]) #
 def read_posts(
-    session: SessionDep,
+    session: ReadSessionDep,
     current_user: Annotated[User, Depends(get_current_user)],
+    request: Request,
     offset: int = 0,
     limit: Annotated[int, Query(le=100)] = 3,
     search: Optional[str] = "",
-    show_all: Optional[bool] = True
+    show_all: Optional[bool] = True,
+    sort: PostSort = "new",
+    cursor: Optional[str] = None,
+    fields: Annotated[Optional[str], Query(description="Comma-separated subset of the post keys to return, e.g. `id,title,excerpt`.")] = None,
 ):
+    post_fields = parse_fields(fields)
+    variant = ",".join(post_fields or ())
+
+    # Optional owner filter, and optional search: full-text (GIN index over title and content) or the old substring
+    # match on content. The total count (`X-Total-Count`, see `app/counts.py`) uses the same filters.
+    filters = []
+    if not show_all:
+        filters.append(Post.owner_id == current_user.id)
+    if search and settings.post_search_mode == "fulltext":
+        filters.append(fulltext_match(search))
+    elif search:
+        filters.append(Post.content.ilike(f"%{search}%"))
+    count_key = (None if show_all else current_user.id, search)
+
+    # Served from the response cache when the same page was built recently. The owner filter makes the page user-specific.
+    # A user with write-behind votes still in the buffer gets an uncached page with their own votes applied (see below).
+    # The cached page is shared by all users, only `liked_by_me` is looked up for each request.
+    cache_key = (None if show_all else current_user.id, offset, limit, search, sort, cursor, post_fields)
+    use_cache = not vote_buffer.has_pending(current_user.id)
+    cached = post_list_response_cache.get(cache_key) if use_cache else None
+    if cached is not None:
+        state, fragments, headers = cached
+        liked, _ = viewer_votes(session, current_user.id, [post_id for post_id, _, _ in state])
+        total = post_total_count(session, tuple(filters), count_key)
+        return viewer_response(request, state, fragments, liked, with_total_count(headers, total), variant)
 
     # Implemenation 1: Without votes
     # select_stmt = (select(Post).options(selectinload(Post.owner))) # With `selectinload`, there will be 2 separate queries. One for `post` and another for `user`. 
@@ -43,33 +89,58 @@ def read_posts(
     # posts = session.exec(select_stmt.where(Post.content.ilike(f"%{search}%")).offset(offset).limit(limit)).all()
 
     # Implementation 2: With votes
-    # Base select with vote count
-    select_stmt = (
-        select(Post, func.count(Vote.post_id).label("votes"))
-        .join(Vote, Vote.post_id == Post.id, isouter=True)
-        .group_by(Post.id)
-    )
+    # select_stmt = (
+    #     select(Post, func.count(Vote.post_id).label("votes"))
+    #     .join(Vote, Vote.post_id == Post.id, isouter=True)
+    #     .group_by(Post.id)
+    # )
 
-    # Optional owner filter
-    if not show_all:
-        select_stmt = select_stmt.where(Post.owner_id == current_user.id)
+    # Implementation 3: With the denormalized vote counter (no JOIN/GROUP BY on the vote table)
+    # The owner is embedded in every post of the response. Without a loader option each `post.owner` is lazily loaded
+    # with its own query (1 + page size queries). `joinedload` fetches the owners in the same query; `innerjoin` is
+    # safe because `owner_id` is NOT NULL.
+    select_stmt = select(Post, Post.votes_count.label("votes")).options(joinedload(Post.owner, innerjoin=True))
+
+    # Sparse fieldset: only the requested columns (see `app/projection.py`)
+    if post_fields is not None:
+        select_stmt = sparse_post_select(post_fields)
 
-    # Optional content search
-    if search:
-        select_stmt = select_stmt.where(Post.content.ilike(f"%{search}%"))
+    if filters:
+        select_stmt = select_stmt.where(*filters)
 
     # Pagination
+    # `cursor` is the keyset token returned in the `X-Next-Cursor` header of the previous page. `offset` is kept for
+    # backward compatibility, but its cost grows with the page number, so the two can't be combined.
+    if cursor and offset:
+        raise HTTPException(
+            status_code = status.HTTP_400_BAD_REQUEST,
+            detail = "Use either `cursor` or `offset`, not both."
+        )
+    select_stmt = order_by_sort(select_stmt, sort)
+    if cursor:
+        select_stmt = apply_cursor(select_stmt, cursor, sort)
     select_stmt = select_stmt.offset(offset).limit(limit)
-    print("SQL query:", select_stmt)
     # Execute query
     posts = session.exec(select_stmt).all()
+    if post_fields is not None:
+        posts = [(row, row.votes) for row in posts]
+
+    # `liked_by_me` for the whole page in one query. It also returns the read-your-own-writes vote count changes of
+    # write-behind mode (empty when the user has no buffered vote).
+    liked, deltas = viewer_votes(session, current_user.id, [post.id for post, _ in posts])
+    if deltas:
+        posts = [(post, votes + deltas.get(post.id, 0)) for post, votes in posts]
+
+    # A full page means there may be more rows after it
+    headers = {}
+    if posts and len(posts) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(sort, posts[-1][0])
 
     # Wrap each row into PostWithVote
-    posts = [
-        PostWithVote(post=PostPublic.model_validate(post), votes=votes)  # ensure PostPublic used
-        for post, votes in posts
-    ]    
-    print("All queried posts:", posts)
+    # posts = [
+    #     PostWithVote(post=PostPublic.model_validate(post), votes=votes)  # ensure PostPublic used
+    #     for post, votes in posts
+    # ]    
 
     if not posts:
         raise HTTPException(
@@ -77,20 +148,162 @@ def read_posts(
             detail = "No post was found."
         )
     
-    return posts
+    # The rows are serialized straight to the `List[PostWithViewerVote]` JSON (see `app/serialization.py`). Returning a
+    # `Response` skips FastAPI's own `response_model` validation and serialization.
+    state = tuple((post.id, post.version, votes) for post, votes in posts)
+    if post_fields is None:
+        fragments = [post_with_votes_fragment(post, votes) for post, votes in posts]
+    else:
+        fragments = [sparse_post_fragment(row, votes, post_fields) for row, votes in posts]
+    if use_cache:
+        post_list_response_cache.set(cache_key, (state, fragments, headers))
+    total = post_total_count(session, tuple(filters), count_key)
+    return viewer_response(request, state, fragments, liked, with_total_count(headers, total), variant)
+
+
+# Ranked full-text search. Declared before `/{post_id}`, otherwise "search" would be matched as a post id.
+@router.get("/search", response_model=List[PostWithVote])
+def search_posts(
+    session: ReadSessionDep,
+    current_user: Annotated[User, Depends(get_current_user)],
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    limit: Annotated[int, Query(le=100)] = 10,
+    cursor: Optional[str] = None,
+):
+    rank = fulltext_rank(q)
+    select_stmt = (
+        select(Post, Post.votes_count.label("votes"), rank.label("rank"))
+        .options(joinedload(Post.owner, innerjoin=True)) # owners in the same query, see `read_posts`
+        .where(fulltext_match(q))
+        .order_by(rank.desc(), Post.id.desc())
+    )
+    # Keyset pagination on (rank, id), the cursor of the next page is returned in the `X-Next-Cursor` header
+    if cursor:
+        select_stmt = apply_search_cursor(select_stmt, cursor, q)
+    posts = session.exec(select_stmt.limit(limit)).all()
+
+    headers = {}
+    if posts and len(posts) == limit:
+        last_post, _, last_rank = posts[-1]
+        headers["X-Next-Cursor"] = encode_search_cursor(q, last_rank, last_post.id)
+
+    if not posts:
+        raise HTTPException(
+            status_code = status.HTTP_404_NOT_FOUND,
+            detail = "No post was found."
+        )
+
+    return Response(
+        content=dump_posts_with_votes((post, votes) for post, votes, _ in posts),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+# Trending feed, ordered by the precomputed `hot_score` (see `post_hot_score` in `app/models.py`). A page is a backwards
+# scan of the (hot_score, id) index from the cursor, with no aggregation over the vote table. Declared before `/{post_id}`.
+@router.get("/hot", response_model=List[PostWithVote])
+def read_hot_posts(
+    session: ReadSessionDep,
+    current_user: Annotated[User, Depends(get_current_user)],
+    request: Request,
+    limit: Annotated[int, Query(le=100)] = 10,
+    cursor: Optional[str] = None,
+):
+    # Same response cache, ETag and write-behind handling as `read_posts`
+    cache_key = ("hot", limit, cursor)
+    use_cache = not vote_buffer.has_pending(current_user.id)
+    cached = post_list_response_cache.get(cache_key) if use_cache else None
+    if cached is not None:
+        return conditional_response(request, *cached)
+
+    select_stmt = (
+        select(Post, Post.votes_count.label("votes"), post_hot_score)
+        .options(joinedload(Post.owner, innerjoin=True))
+        .order_by(post_hot_score.desc(), Post.id.desc())
+    )
+    if cursor:
+        select_stmt = select_stmt.where(tuple_(post_hot_score, Post.id) < decode_hot_cursor(cursor))
+    rows = session.exec(select_stmt.limit(limit)).all()
+
+    headers = {}
+    if rows and len(rows) == limit:
+        last_post, _, last_score = rows[-1]
+        headers["X-Next-Cursor"] = encode_hot_cursor(last_score, last_post.id)
+    posts = [(post, votes) for post, votes, _ in rows]
+    if not use_cache:
+        deltas = pending_vote_deltas(session, current_user.id, [post.id for post, _ in posts])
+        posts = [(post, votes + deltas.get(post.id, 0)) for post, votes in posts]
+
+    if not posts:
+        raise HTTPException(
+            status_code = status.HTTP_404_NOT_FOUND,
+            detail = "No post was found."
+        )
+
+    etag = post_etag(*((post.id, post.version, votes) for post, votes in posts), variant="hot")
+    body = dump_posts_with_votes(posts)
+    if use_cache:
+        post_list_response_cache.set(cache_key, (etag, body, headers))
+    return conditional_response(request, etag, body, headers)
+
+
+# Full export as NDJSON, for analytics. Declared before `/{post_id}` like `/search`.
+# The rows come from a server-side cursor (`stream_results`), `export_batch_size` at a time, and each batch is written as
+# one chunk of the response: memory stays the same whatever the size of the table. The next batch is only fetched once
+# the previous chunk has been sent, so a slow client slows down the cursor instead of filling the server's memory.
+# The stream has its own session (and connection), which stays open until the last row has been sent.
+def export_posts_select(owner_id: Optional[int], created_after: Optional[datetime], created_before: Optional[datetime]):
+    select_stmt = select(Post.id, Post.owner_id, Post.title, Post.content, Post.published, Post.created_at, Post.votes_count)
+    if owner_id is not None:
+        select_stmt = select_stmt.where(Post.owner_id == owner_id)
+    if created_after is not None:
+        select_stmt = select_stmt.where(Post.created_at >= created_after)
+    if created_before is not None:
+        select_stmt = select_stmt.where(Post.created_at < created_before)
+    return select_stmt.order_by(Post.id).execution_options(stream_results=True, yield_per=settings.export_batch_size)
+
+def stream_export(bind, select_stmt):
+    with Session(bind) as session:
+        for rows in session.exec(select_stmt).partitions():
+            yield dump_export_rows(rows)
+
+@router.get("/export", response_class=StreamingResponse)
+def export_posts(
+    current_user: Annotated[User, Depends(get_current_user)],
+    owner_id: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+):
+    select_stmt = export_posts_select(owner_id, created_after, created_before)
+    return StreamingResponse(stream_export(read_engine(current_user.id), select_stmt), media_type="application/x-ndjson")
+
 
+@router.get("/{post_id}", response_model=PostWithViewerVote)
+def read_post(post_id: int, request: Request, session: ReadSessionDep, current_user: Annotated[User, Depends(get_current_user)],):
+    use_cache = not vote_buffer.has_pending(current_user.id)
+    cached = post_response_cache.get(post_id) if use_cache else None
+    if cached is not None:
+        state, fragment = cached
+        liked, _ = viewer_votes(session, current_user.id, [post_id])
+        return viewer_response(request, state, [fragment], liked, many=False)
 
-@router.get("/{post_id}", response_model=PostWithVote)
-def read_post(post_id: int, session: SessionDep, current_user: Annotated[User, Depends(get_current_user)],):
     # Implemenation 1: Without votes
     # post = session.get(Post, post_id)
 
     # Implementation 2: With votes
+    # select_stmt = (
+    #     select(Post, func.count(Vote.post_id).label("votes"))
+    #     .join(Vote, Vote.post_id == Post.id, isouter=True)
+    #     .where(Post.id == post_id)
+    #     .group_by(Post.id)
+    # )
+
+    # Implementation 3: With the denormalized vote counter
     select_stmt = (
-        select(Post, func.count(Vote.post_id).label("votes"))
-        .join(Vote, Vote.post_id == Post.id, isouter=True)
+        select(Post, Post.votes_count.label("votes"))
+        .options(joinedload(Post.owner, innerjoin=True)) # owner in the same query, see `read_posts`
         .where(Post.id == post_id)
-        .group_by(Post.id)
     )
 
     post = session.exec(select_stmt).first()  # row is a tuple: (Post, vote_count)
@@ -108,13 +321,16 @@ def read_post(post_id: int, session: SessionDep, current_user: Annotated[User, D
 
     post_obj, vote_count = post
 
-    # Convert Post -> PostPublic
-    post_public = PostPublic.model_validate(post_obj)
-
-    # Wrap into PostWithVote
-    post = PostWithVote(post=post_public, votes=vote_count)
+    # `liked_by_me`, and read-your-own-writes in write-behind vote mode
+    liked, deltas = viewer_votes(session, current_user.id, [post_id])
+    vote_count += deltas.get(post_id, 0)
 
-    return post
+    # Serialized straight to the `PostWithViewerVote` JSON, without building PostPublic/PostWithVote first
+    state = ((post_obj.id, post_obj.version, vote_count),)
+    fragment = post_with_votes_fragment(post_obj, vote_count)
+    if use_cache:
+        post_response_cache.set(post_id, (state, fragment))
+    return viewer_response(request, state, [fragment], liked, many=False)
 
 
 @router.patch("/{post_id}", response_model=PostPublic)
@@ -126,9 +342,14 @@ def update_post(post_id: int, post: PostUpdate, session: SessionDep):
             detail= f"Post with id: {post_id} was not found."
         )
     post_data = post.model_dump(exclude_unset=True)
+    if "content" in post_data:
+        post_data["excerpt"] = make_excerpt(post_data["content"])
     post_db.sqlmodel_update(post_data)
+    post_db.version = Post.version + 1 # incremented in SQL, so concurrent updates can't produce the same version
     session.add(post_db)
     session.commit()
+    invalidate_post(post_id)
+    record_write(post_db.owner_id)
     session.refresh(post_db)
     return post_db
 
@@ -149,4 +370,89 @@ def delete_post(post_id: int, session: SessionDep, current_user: Annotated[User,
         )
      
     session.delete(post)
-    session.commit()
\ No newline at end of file
+    session.commit()
+    invalidate_post(post_id)
+    invalidate_post_counts()
+    record_write(current_user.id)
+
+
+########################################### ASYNC MODE ###########################################
+# The async endpoints reuse the sync handlers above through `AsyncSession.run_sync`. The handler body runs inside a greenlet
+# on the event loop, and every database call it makes is awaited on the async driver, so no threadpool slot is held.
+# The response model is built inside `run_sync` as well, because relationship lazy loads (e.g. `Post.owner`) are only
+# allowed while we are inside the greenlet.
+
+@async_router.post("/", response_model=PostPublic, status_code = status.HTTP_201_CREATED)
+async def create_post_async(session: AsyncSessionDep, current_user: Annotated[User, Depends(get_current_user_async)], post: PostCreate, ):
+    return await session.run_sync(lambda s: PostPublic.model_validate(create_post(s, current_user, post)))
+
+
+@async_router.get("/", response_model=List[PostWithViewerVote])
+async def read_posts_async(
+    session: AsyncReadSessionDep,
+    current_user: Annotated[User, Depends(get_current_user_async)],
+    request: Request,
+    offset: int = 0,
+    limit: Annotated[int, Query(le=100)] = 3,
+    search: Optional[str] = "",
+    show_all: Optional[bool] = True,
+    sort: PostSort = "new",
+    cursor: Optional[str] = None,
+    fields: Annotated[Optional[str], Query(description="Comma-separated subset of the post keys to return, e.g. `id,title,excerpt`.")] = None,
+):
+    return await session.run_sync(read_posts, current_user, request, offset, limit, search, show_all, sort, cursor, fields)
+
+
+@async_router.get("/search", response_model=List[PostWithVote])
+async def search_posts_async(
+    session: AsyncReadSessionDep,
+    current_user: Annotated[User, Depends(get_current_user_async)],
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    limit: Annotated[int, Query(le=100)] = 10,
+    cursor: Optional[str] = None,
+):
+    return await session.run_sync(search_posts, current_user, q, limit, cursor)
+
+
+@async_router.get("/hot", response_model=List[PostWithVote])
+async def read_hot_posts_async(
+    session: AsyncReadSessionDep,
+    current_user: Annotated[User, Depends(get_current_user_async)],
+    request: Request,
+    limit: Annotated[int, Query(le=100)] = 10,
+    cursor: Optional[str] = None,
+):
+    return await session.run_sync(read_hot_posts, current_user, request, limit, cursor)
+
+
+# `AsyncSession.stream` opens the server-side cursor on asyncpg; batches are fetched without blocking the event loop.
+async def stream_export_async(bind, select_stmt):
+    async with AsyncSession(bind) as session:
+        result = await session.stream(select_stmt)
+        async for rows in result.partitions():
+            yield dump_export_rows(rows)
+
+@async_router.get("/export", response_class=StreamingResponse)
+async def export_posts_async(
+    current_user: Annotated[User, Depends(get_current_user_async)],
+    owner_id: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+):
+    select_stmt = export_posts_select(owner_id, created_after, created_before)
+    return StreamingResponse(stream_export_async(read_async_engine(current_user.id), select_stmt), media_type="application/x-ndjson")
+
+
+@async_router.get("/{post_id}", response_model=PostWithViewerVote)
+async def read_post_async(post_id: int, request: Request, session: AsyncReadSessionDep, current_user: Annotated[User, Depends(get_current_user_async)],):
+    return await session.run_sync(lambda s: read_post(post_id, request, s, current_user))
+
+
+@async_router.patch("/{post_id}", response_model=PostPublic)
+async def update_post_async(post_id: int, post: PostUpdate, session: AsyncSessionDep):
+    return await session.run_sync(lambda s: PostPublic.model_validate(update_post(post_id, post, s)))
+
+
+@async_router.delete("/{post_id}", status_code = status.HTTP_204_NO_CONTENT)
+async def delete_post_async(post_id: int, session: AsyncSessionDep, current_user: Annotated[User, Depends(get_current_user_async)],):
+    await session.run_sync(lambda s: delete_post(post_id, s, current_user))
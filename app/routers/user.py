@@ -1,31 +1,87 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import Annotated, List
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, status
 from psycopg2 import IntegrityError
-from ..models import User, CreateUser, ReadUser, UpdateUser
-from ..database import SessionDep
+from ..models import User, CreateUser, ReadUser, UpdateUser, Post, Vote, BulkUserItemResult, BulkUserResult
+from ..database import SessionDep, AsyncSessionDep
 from .. import utils
-from ..oauth2 import get_current_user
-from sqlmodel import select
+from ..oauth2 import get_current_user, get_current_user_async, user_cache
+from ..http_cache import invalidate_all_posts
+from ..counts import user_total_count, invalidate_user_counts, invalidate_post_counts
+from ..replicas import ReadSessionDep, AsyncReadSessionDep, record_write
+from sqlmodel import Session, select, update, or_
+from sqlalchemy import String, column, values
+from sqlalchemy.dialects.postgresql import insert
 
 router = APIRouter(prefix="/user", tags=["User"])
+async_router = APIRouter(prefix="/user", tags=["User"])
 
-@router.post("/", response_model=ReadUser, status_code=status.HTTP_201_CREATED)
-def create_user(inp_user: CreateUser, session: SessionDep):
+# Passwords are hashed by the endpoints (on the hashing pool, see `app/utils.py`) and the database work is shared by the
+# sync and async endpoints through these helpers, since the async ones await the hash outside of `run_sync`.
+def insert_user(session: Session, inp_user: CreateUser, hashed_password: str) -> User:
     # Convert input data to dict and add hashed password
     user_data = inp_user.model_dump()
-    user_data["hashed_password"] = utils.hash_password(user_data["password"])
+    user_data["hashed_password"] = hashed_password
     user = User(**user_data)
     try:
         session.add(user)
         session.commit()
+        invalidate_user_counts()
         session.refresh(user)
     except Exception as e:
         session.rollback()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     return user
 
-@router.patch("/{user_id}", response_model=ReadUser, status_code=status.HTTP_200_OK)
-def update_user(user_id:int, user: UpdateUser, session:SessionDep):
+# Bulk insert: one `INSERT ... SELECT FROM (VALUES ...) ON CONFLICT DO NOTHING RETURNING` per chunk of users instead of
+# one transaction per user. A row that clashes with an existing user (or an earlier row of the batch) on the username or
+# email is skipped rather than aborting the batch, and reported as a conflict. Chunks keep the number of bind parameters
+# below the driver limits (asyncpg allows 32767 per statement).
+BULK_INSERT_CHUNK = 1_000
+BULK_INSERT_COLUMNS = ("username", "email", "full_name", "password", "hashed_password")
+
+def bulk_insert_users(session: Session, users: list[CreateUser], hashed_passwords: list[str]) -> list[BulkUserItemResult]:
+    created: dict[tuple[str, str], int] = {} # (username, email) -> id of the inserted rows
+    for start in range(0, len(users), BULK_INSERT_CHUNK):
+        rows = [
+            (user.username, user.email, user.full_name, user.password, hashed_password)
+            for user, hashed_password in zip(users[start:start + BULK_INSERT_CHUNK], hashed_passwords[start:start + BULK_INSERT_CHUNK])
+        ]
+        users_values = values(*(column(name, String) for name in BULK_INSERT_COLUMNS), name="v").data(rows)
+        insert_stmt = (
+            insert(User)
+            .from_select(BULK_INSERT_COLUMNS, select(*users_values.c))
+            .on_conflict_do_nothing()
+            .returning(User.id, User.username, User.email)
+        )
+        created.update(((username, email), user_id) for user_id, username, email in session.exec(insert_stmt))
+    session.commit()
+    invalidate_user_counts()
+
+    # A row was inserted if its (username, email) came back, and only the first row with that pair can have been: the
+    # other rows are conflicts. Matching on the username alone would credit a row rejected for its email with the id
+    # of a later row that has the same username.
+    results: list[BulkUserItemResult | None] = []
+    for user in users:
+        user_id = created.pop((user.username, user.email), None)
+        results.append(BulkUserItemResult(username=user.username, status="created", id=user_id) if user_id is not None else None)
+
+    # Tell which of the username and email already exists, with one lookup for all the rejected rows
+    rejected = [user for user, result in zip(users, results) if result is None]
+    if rejected:
+        existing = session.exec(
+            select(User.username, User.email).where(
+                or_(User.username.in_([user.username for user in rejected]), User.email.in_([user.email for user in rejected]))
+            )
+        ).all()
+        taken_usernames = {username for username, _ in existing}
+        taken_emails = {email for _, email in existing}
+        for index, (user, result) in enumerate(zip(users, results)):
+            if result is None:
+                taken = [name for name, is_taken in (("Username", user.username in taken_usernames), ("Email", user.email in taken_emails)) if is_taken]
+                results[index] = BulkUserItemResult(username=user.username, status="conflict", detail=f"{' and '.join(taken) or 'User'} already exists.")
+    return results
+
+def apply_user_update(session: Session, user_id: int, user: UpdateUser, hashed_password: str | None) -> User:
     user_db = session.get(User, user_id)
     if not user_db:
         raise HTTPException(
@@ -35,13 +91,19 @@ def update_user(user_id:int, user: UpdateUser, session:SessionDep):
 
     user_data = user.model_dump(exclude_unset=True)
     # Handle password separately
-    if "password" in user_data:
+    if hashed_password is not None:
         user_db.password = user_data["password"]
-        user_db.hashed_password = utils.hash_password(user_data["password"])
+        user_db.hashed_password = hashed_password
+    # The owner's public profile is embedded in every post they own, so those posts get a new version (and ETag)
+    if user_data.keys() & ReadUser.model_fields.keys():
+        session.exec(update(Post).where(Post.owner_id == user_id).values(version=Post.version + 1))
     try:
         user_db.sqlmodel_update(user_data)
         session.add(user_db)
         session.commit()
+        user_cache.invalidate(user_id)
+        invalidate_all_posts()
+        record_write(user_id)
         session.refresh(user_db)
         return user_db
     except IntegrityError:
@@ -57,21 +119,46 @@ def update_user(user_id:int, user: UpdateUser, session:SessionDep):
             detail = f"Failed to update user: {e}",
         )     
 
+@router.post("/", response_model=ReadUser, status_code=status.HTTP_201_CREATED)
+def create_user(inp_user: CreateUser, session: SessionDep):
+    return insert_user(session, inp_user, utils.hash_password(inp_user.password))
+
+# Bulk import, e.g. when migrating a tenant's accounts. The passwords are hashed in parallel on the hashing pool and the
+# users inserted set-based (see `bulk_insert_users`); rows that clash on username or email come back as conflicts.
+@router.post("/bulk", response_model=BulkUserResult, status_code=status.HTTP_200_OK)
+def create_users_bulk(
+    users: Annotated[List[CreateUser], Body(min_length=1, max_length=5_000)],
+    session: SessionDep,
+    current_user: Annotated[User, Depends(get_current_user)],
+):
+    results = bulk_insert_users(session, users, utils.hash_passwords([user.password for user in users]))
+    return BulkUserResult(created=sum(result.status == "created" for result in results), results=results)
+
+@router.patch("/{user_id}", response_model=ReadUser, status_code=status.HTTP_200_OK)
+def update_user(user_id:int, user: UpdateUser, session:SessionDep):
+    hashed_password = utils.hash_password(user.password) if user.password is not None else None
+    return apply_user_update(session, user_id, user, hashed_password)
+
 
 @router.get("/", response_model=list[ReadUser], status_code=status.HTTP_200_OK)
 def read_user(
     current_user: Annotated[User, Depends(get_current_user)], # Annotated[User, Depends(get_current_user)] ensures that this API requires an authentication token. 
-    session: SessionDep,
+    session: ReadSessionDep,
+    response: Response,
     offset: int = 0,
     limit: Annotated[int, Query(le=100)] = 100,
 ):
     # `current_user` details will be used to check for things like resource permission, and use other user details required during backend processing.
     print("current_user_details: ", current_user)
     users = session.exec(select(User).offset(offset).limit(limit)).all()
+    # Total number of users for the pagination (see `app/counts.py`)
+    total = user_total_count(session)
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
     return users
 
 @router.get("/{user_id}", response_model=ReadUser, status_code=status.HTTP_200_OK)
-def read_user(user_id: int, session: SessionDep):
+def read_user_by_id(user_id: int, session: SessionDep):
     user = session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail = "User not found")
@@ -82,6 +169,59 @@ def delete_user(user_id: int, session: SessionDep):
     user = session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    # The user's votes are removed by `ON DELETE CASCADE`, so take them off the denormalized counters in the same transaction.
+    session.exec(
+        update(Post)
+        .where(Post.id.in_(select(Vote.post_id).where(Vote.user_id == user_id)))
+        .values(votes_count=Post.votes_count - 1)
+    )
     session.delete(user)
     session.commit()
-    return {"ok": True}
\ No newline at end of file
+    user_cache.invalidate(user_id)
+    invalidate_all_posts()
+    invalidate_user_counts()
+    invalidate_post_counts() # the user's posts were deleted with it
+    return {"ok": True}
+
+
+########################################### ASYNC MODE ###########################################
+# Same pattern as in `post.py`: the sync handlers (or the helpers above) run inside `AsyncSession.run_sync`, and ORM
+# objects are converted to the response model before leaving the greenlet. Passwords are hashed before entering it.
+
+@async_router.post("/", response_model=ReadUser, status_code=status.HTTP_201_CREATED)
+async def create_user_async(inp_user: CreateUser, session: AsyncSessionDep):
+    hashed_password = await utils.hash_password_async(inp_user.password)
+    return await session.run_sync(lambda s: ReadUser.model_validate(insert_user(s, inp_user, hashed_password)))
+
+@async_router.post("/bulk", response_model=BulkUserResult, status_code=status.HTTP_200_OK)
+async def create_users_bulk_async(
+    users: Annotated[List[CreateUser], Body(min_length=1, max_length=5_000)],
+    session: AsyncSessionDep,
+    current_user: Annotated[User, Depends(get_current_user_async)],
+):
+    hashed_passwords = await utils.hash_passwords_async([user.password for user in users])
+    results = await session.run_sync(bulk_insert_users, users, hashed_passwords)
+    return BulkUserResult(created=sum(result.status == "created" for result in results), results=results)
+
+@async_router.patch("/{user_id}", response_model=ReadUser, status_code=status.HTTP_200_OK)
+async def update_user_async(user_id: int, user: UpdateUser, session: AsyncSessionDep):
+    hashed_password = await utils.hash_password_async(user.password) if user.password is not None else None
+    return await session.run_sync(lambda s: ReadUser.model_validate(apply_user_update(s, user_id, user, hashed_password)))
+
+@async_router.get("/", response_model=list[ReadUser], status_code=status.HTTP_200_OK)
+async def read_user_async(
+    current_user: Annotated[User, Depends(get_current_user_async)],
+    session: AsyncReadSessionDep,
+    response: Response,
+    offset: int = 0,
+    limit: Annotated[int, Query(le=100)] = 100,
+):
+    return await session.run_sync(lambda s: [ReadUser.model_validate(u) for u in read_user(current_user, s, response, offset, limit)])
+
+@async_router.get("/{user_id}", response_model=ReadUser, status_code=status.HTTP_200_OK)
+async def read_user_by_id_async(user_id: int, session: AsyncSessionDep):
+    return await session.run_sync(lambda s: ReadUser.model_validate(read_user_by_id(user_id, s)))
+
+@async_router.delete("/{user_id}")
+async def delete_user_async(user_id: int, session: AsyncSessionDep):
+    return await session.run_sync(lambda s: delete_user(user_id, s))
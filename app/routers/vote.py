@@ -1,13 +1,125 @@
-from fastapi import APIRouter, HTTPException,status, Depends, FastAPI, Response
-from ..models import User, Post, Vote, VoteApiSchema
-from ..database import SessionDep
-from ..oauth2 import get_current_user
+from fastapi import APIRouter, Body, HTTPException,status, Depends, FastAPI, Response
+from fastapi.responses import JSONResponse
+from ..models import User, Post, Vote, VoteApiSchema, VoteBatchItemResult, VoteBatchResult
+from ..database import SessionDep, AsyncSessionDep, engine
+from ..config import settings
+from ..vote_buffer import VoteBuffer
+from ..oauth2 import get_current_user, get_current_user_async
 from .. import utils
-from typing import Annotated
-from sqlmodel import select, delete
+from ..http_cache import invalidate_post
+from ..replicas import record_write
+from typing import Annotated, List
+from sqlmodel import Session, select, delete, update, func
+from sqlalchemy import Integer, column, values, tuple_
+from sqlalchemy.dialects.postgresql import insert
 
 
 router = APIRouter(prefix = "/vote", tags=["Login"])
+async_router = APIRouter(prefix = "/vote", tags=["Login"])
+
+# Set-based vote writes. Each helper is ONE statement: the INSERT/DELETE on the vote table and the update of the
+# denormalized `post.votes_count` are chained in a data-modifying CTE, e.g.
+#
+#   WITH changed AS (INSERT INTO vote (user_id, post_id) SELECT v.user_id, v.post_id FROM (VALUES ...) AS v
+#                    JOIN post ON post.id = v.post_id JOIN "user" ON "user".id = v.user_id
+#                    ON CONFLICT DO NOTHING RETURNING vote.post_id)
+#   UPDATE post SET votes_count = votes_count + counts.n
+#   FROM (SELECT post_id, count(*) AS n FROM changed GROUP BY post_id) AS counts WHERE post.id = counts.post_id
+#   RETURNING post.id
+#
+# `ON CONFLICT DO NOTHING` makes a repeated like a no-op instead of an error, and joining `post` and `user` skips votes
+# whose post (or user) doesn't exist, so the statement never fails on bad input. They take (user_id, post_id) pairs, so
+# that the write-behind buffer can flush votes of many users at once. The returned ids are the posts actually changed.
+
+def _update_counts(changed, sign: int):
+    counts = select(changed.c.post_id, func.count().label("n")).group_by(changed.c.post_id).subquery("counts")
+    return (
+        update(Post)
+        .where(Post.id == counts.c.post_id)
+        .values(votes_count=Post.votes_count + sign * counts.c.n)
+        .returning(Post.id)
+    )
+
+def like_votes(session: Session, pairs: list[tuple[int, int]]) -> set[int]:
+    pairs_values = values(column("user_id", Integer), column("post_id", Integer), name="v").data(pairs)
+    changed = (
+        insert(Vote)
+        .from_select(
+            ["user_id", "post_id"],
+            select(pairs_values.c.user_id, pairs_values.c.post_id)
+            .join(Post, Post.id == pairs_values.c.post_id)
+            .join(User, User.id == pairs_values.c.user_id),
+        )
+        .on_conflict_do_nothing()
+        .returning(Vote.post_id)
+        .cte("changed")
+    )
+    return set(session.exec(_update_counts(changed, 1)).scalars())
+
+def unlike_votes(session: Session, pairs: list[tuple[int, int]]) -> set[int]:
+    changed = (
+        delete(Vote)
+        .where(tuple_(Vote.user_id, Vote.post_id).in_(pairs))
+        .returning(Vote.post_id)
+        .cte("changed")
+    )
+    return set(session.exec(_update_counts(changed, -1)).scalars())
+
+def like_posts(session: Session, user_id: int, post_ids: list[int]) -> set[int]:
+    return like_votes(session, [(user_id, post_id) for post_id in post_ids])
+
+def unlike_posts(session: Session, user_id: int, post_ids: list[int]) -> set[int]:
+    return unlike_votes(session, [(user_id, post_id) for post_id in post_ids])
+
+# Write-behind mode (see `app/vote_buffer.py`): the buffer is flushed with the same set-based statements.
+def flush_votes(batch: dict[tuple[int, int], int]):
+    likes = [key for key, vote_dir in batch.items() if vote_dir == 1]
+    unlikes = [key for key, vote_dir in batch.items() if vote_dir == 0]
+    with Session(engine) as session:
+        changed = (like_votes(session, likes) if likes else set()) | (unlike_votes(session, unlikes) if unlikes else set())
+        session.commit()
+    for post_id in changed:
+        invalidate_post(post_id)
+
+vote_buffer = VoteBuffer(
+    flush_votes,
+    max_pending=settings.vote_buffer_max_pending,
+    flush_size=settings.vote_buffer_flush_size,
+    flush_interval=settings.vote_buffer_flush_interval,
+)
+
+# How much each post's vote count changes once the buffered votes `pending` (post_id -> vote_dir) are written, given the
+# posts among them that the user currently likes in the database.
+def vote_deltas(pending: dict[int, int], liked: set[int]) -> dict[int, int]:
+    return {
+        post_id: (1 if vote_dir == 1 and post_id not in liked else -1 if vote_dir == 0 and post_id in liked else 0)
+        for post_id, vote_dir in pending.items()
+    }
+
+# Read-your-own-writes for the read endpoints: how much each post's vote count changes once this user's buffered votes
+# are written. Only the (few) posts with a pending vote are looked up, with one query on the vote primary key.
+def pending_vote_deltas(session: Session, user_id: int, post_ids) -> dict[int, int]:
+    pending = vote_buffer.pending_for(user_id, post_ids)
+    if not pending:
+        return {}
+    liked = set(session.exec(select(Vote.post_id).where(Vote.user_id == user_id, Vote.post_id.in_(pending))).all())
+    return vote_deltas(pending, liked)
+
+# `liked_by_me` of the read endpoints: which of `post_ids` this user likes, and the vote count changes of their buffered
+# votes (see `pending_vote_deltas`), with one query on the vote primary key for the whole page. Buffered votes count
+# as the user's current intent.
+def viewer_votes(session: Session, user_id: int, post_ids) -> tuple[set[int], dict[int, int]]:
+    post_ids = list(post_ids)
+    if not post_ids:
+        return set(), {}
+    liked = set(session.exec(select(Vote.post_id).where(Vote.user_id == user_id, Vote.post_id.in_(post_ids))).all())
+    pending = vote_buffer.pending_for(user_id, post_ids)
+    deltas = vote_deltas(pending, liked)
+    liked = (liked | {post_id for post_id, vote_dir in pending.items() if vote_dir == 1}) - {post_id for post_id, vote_dir in pending.items() if vote_dir == 0}
+    return liked, deltas
+
+def post_exists(session: Session, post_id: int) -> bool:
+    return session.exec(select(Post.id).where(Post.id == post_id)).first() is not None
 
 # A vote record exists only for likes. A dislike doesn't have any record.
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -16,49 +128,115 @@ def vote(
     session: SessionDep,
     current_user: Annotated[User, Depends(get_current_user)],
 ):
-    post_db = session.exec(select(Post).where(Post.id==vote.post_id)).first()
-
-    if not post_db:
-        raise HTTPException(
-            status_code = status.HTTP_404_NOT_FOUND,
-            detail = "Post was not found."
-        )
-
-    vote_stmt = select(Vote).where(
-        Vote.user_id == current_user.id,
-        Vote.post_id == vote.post_id,
-    )
-    current_vote = session.exec(vote_stmt).first()
+    # Write-behind: only record the intent. Whether it changes anything (and whether the post exists) is settled by the flush.
+    record_write(current_user.id)
+    if settings.vote_write_behind:
+        vote_buffer.add(current_user.id, vote.post_id, vote.vote_dir)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"detail": "Vote accepted"})
 
+    # The happy path is a single statement. Only when nothing changed do we look at why (missing post vs. no-op vote).
     if vote.vote_dir == 1:
-        if current_vote:
+        changed = like_posts(session, current_user.id, [vote.post_id])
+        session.commit()
+        if changed:
+            invalidate_post(vote.post_id)
+            return {"detail": "Successfully liked the post"}
+
+        if not post_exists(session, vote.post_id):
             raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail=f"User '{current_user.full_name}' has already liked this post.",
+                status_code = status.HTTP_404_NOT_FOUND,
+                detail = "Post was not found."
             )
-
-        db_vote = Vote(
-            post_id=vote.post_id,
-            user_id=current_user.id,
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"User '{current_user.full_name}' has already liked this post.",
         )
 
-        session.add(db_vote)
-        session.commit()
-        return {"detail": "Successfully liked the post"}
-
     # vote_dir != 1 → unlike
-    if not current_vote:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Like does not exist.",
-        )
+    changed = unlike_posts(session, current_user.id, [vote.post_id])
+    session.commit()
+    if changed:
+        invalidate_post(vote.post_id)
+        return {"detail": "Successfully unliked the post"}
 
-    session.exec(
-        delete(Vote).where(
-            Vote.user_id == current_user.id,
-            Vote.post_id == vote.post_id,
+    if not post_exists(session, vote.post_id):
+        raise HTTPException(
+            status_code = status.HTTP_404_NOT_FOUND,
+            detail = "Post was not found."
         )
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Like does not exist.",
     )
+
+
+# Applies a burst of (offline-queued) votes in one transaction: one statement for all likes, one for all unlikes, and one
+# lookup to tell missing posts apart from no-op votes. If the same post appears several times, the last item is the
+# user's final intent and wins; the earlier ones are reported as "superseded".
+# In write-behind mode the final intents go through the buffer like single votes (so they stay ordered with them) and
+# are reported as "accepted" with a 202. A batch interrupted by a full buffer (503) can be resent as is.
+@router.post("/batch", response_model=VoteBatchResult, status_code=status.HTTP_200_OK)
+def vote_batch(
+    votes: Annotated[List[VoteApiSchema], Body(min_length=1, max_length=500)],
+    session: SessionDep,
+    current_user: Annotated[User, Depends(get_current_user)],
+):
+    final_votes = {item.post_id: index for index, item in enumerate(votes)}
+    like_ids = [item.post_id for index, item in enumerate(votes) if final_votes[item.post_id] == index and item.vote_dir == 1]
+    unlike_ids = [item.post_id for index, item in enumerate(votes) if final_votes[item.post_id] == index and item.vote_dir == 0]
+
+    if settings.vote_write_behind:
+        record_write(current_user.id)
+        for post_id in like_ids:
+            vote_buffer.add(current_user.id, post_id, 1)
+        for post_id in unlike_ids:
+            vote_buffer.add(current_user.id, post_id, 0)
+        results = [
+            VoteBatchItemResult(post_id=item.post_id, vote_dir=item.vote_dir, status="accepted" if final_votes[item.post_id] == index else "superseded")
+            for index, item in enumerate(votes)
+        ]
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=VoteBatchResult(results=results).model_dump())
+
+    liked = like_posts(session, current_user.id, like_ids) if like_ids else set()
+    unliked = unlike_posts(session, current_user.id, unlike_ids) if unlike_ids else set()
+    unchanged = set(like_ids + unlike_ids) - liked - unliked
+    existing = set(session.exec(select(Post.id).where(Post.id.in_(unchanged))).all()) if unchanged else set()
     session.commit()
 
-    return {"detail": "Successfully unliked the post"}
\ No newline at end of file
+    for post_id in liked | unliked:
+        invalidate_post(post_id)
+    record_write(current_user.id)
+
+    results = []
+    for index, item in enumerate(votes):
+        if final_votes[item.post_id] != index:
+            item_status = "superseded"
+        elif item.post_id in liked:
+            item_status = "liked"
+        elif item.post_id in unliked:
+            item_status = "unliked"
+        elif item.post_id not in existing:
+            item_status = "post_not_found"
+        else:
+            item_status = "already_liked" if item.vote_dir == 1 else "not_liked"
+        results.append(VoteBatchItemResult(post_id=item.post_id, vote_dir=item.vote_dir, status=item_status))
+
+    return VoteBatchResult(results=results)
+
+
+# Async mode: see the note in `post.py` on how the sync handler is reused through `run_sync`.
+@async_router.post("/", status_code=status.HTTP_201_CREATED)
+async def vote_async(
+    payload: VoteApiSchema, # not named `vote`, so that it doesn't shadow the sync handler we call below
+    session: AsyncSessionDep,
+    current_user: Annotated[User, Depends(get_current_user_async)],
+):
+    return await session.run_sync(lambda s: vote(payload, s, current_user))
+
+@async_router.post("/batch", response_model=VoteBatchResult, status_code=status.HTTP_200_OK)
+async def vote_batch_async(
+    votes: Annotated[List[VoteApiSchema], Body(min_length=1, max_length=500)],
+    session: AsyncSessionDep,
+    current_user: Annotated[User, Depends(get_current_user_async)],
+):
+    return await session.run_sync(lambda s: vote_batch(votes, s, current_user))
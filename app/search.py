@@ -0,0 +1,26 @@
+from sqlalchemy import func, cast, literal, tuple_
+from sqlalchemy.dialects.postgresql import REGCONFIG, REAL
+from .models import Post, post_search_vector
+from .pagination import decode_search_cursor
+
+# Full-text search over posts, served by the GIN index on `post.search_vector` (see `app/models.py`).
+# `websearch_to_tsquery` accepts what users type into a search box ("quoted phrases", -exclusions, OR) and never
+# raises a syntax error, unlike `to_tsquery`.
+
+SEARCH_CONFIG = cast(literal("english"), REGCONFIG) # must match the configuration used by the generated column
+
+def fulltext_query(search: str):
+    return func.websearch_to_tsquery(SEARCH_CONFIG, search)
+
+def fulltext_match(search: str):
+    return post_search_vector.op("@@")(fulltext_query(search))
+
+def fulltext_rank(search: str):
+    # `ts_rank_cd` also rewards matched terms that are close to each other. Title matches weigh more (weight A).
+    return func.ts_rank_cd(post_search_vector, fulltext_query(search))
+
+def apply_search_cursor(select_stmt, cursor: str, search: str):
+    last_rank, last_id = decode_search_cursor(cursor, search)
+    # `ts_rank_cd` returns a `real`. Comparing against the cursor value as `real` too (not as a float8 parameter) keeps
+    # the comparison exact, so the last row of the previous page is not returned again.
+    return select_stmt.where(tuple_(fulltext_rank(search), Post.id) < tuple_(cast(literal(last_rank), REAL), last_id))
@@ -0,0 +1,118 @@
+import argparse
+import os
+import signal
+import socket
+import time
+import uvicorn
+from . import startup
+
+# Production entrypoint: one pre-forking master and N uvicorn workers sharing the listening socket.
+#
+#   python -m app.server --workers 4 --port 8000
+#
+# - Preload: the app is imported once, in the master, before forking. Workers start without re-importing anything and
+#   share the imported code pages (copy-on-write). Each worker runs its own lifespan (schema check, pool warm-up,
+#   background threads), so no thread or event loop crosses a fork.
+# - Fork safety: the engines' pools are reset in every child (see `dispose_engines_after_fork` in `app/database.py`).
+# - Graceful drain: SIGTERM (or Ctrl+C) on the master is forwarded to the workers. Each one stops accepting, fails its
+#   readiness probe, finishes its in-flight requests (up to `--graceful-timeout` seconds), then runs the lifespan
+#   shutdown (e.g. the last write-behind vote flush). The master exits once every worker has.
+# - A worker that dies is replaced. A worker that dies right after starting (e.g. schema check failed) stops the server
+#   instead of being restarted in a loop.
+
+FAST_EXIT = 5.0 # seconds: a worker exiting sooner than this after starting is considered a startup failure
+
+class Server(uvicorn.Server):
+    # Readiness fails as soon as the worker is told to stop, so the load balancer takes it out while it drains. The
+    # lifespan shutdown would be too late: uvicorn runs it after the drain.
+    def handle_exit(self, sig, frame):
+        startup.ready = False
+        super().handle_exit(sig, frame)
+
+def run_worker(sock: socket.socket, args):
+    from .orm_main import app # already imported by the master, this is a lookup
+    config = uvicorn.Config(
+        app,
+        log_level=args.log_level,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        lifespan="on",
+    )
+    Server(config).run(sockets=[sock])
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.server", description="Pre-forking multi-process server.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="seconds to finish in-flight requests on SIGTERM")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    from . import orm_main  # preload
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.set_inheritable(True)
+
+    workers: dict[int, float] = {} # pid -> start time
+    stopping = False
+    failed = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            # Worker: uvicorn installs its own SIGTERM/SIGINT handlers
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(sock, args)
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {e!r}")
+                code = 1
+            finally:
+                os._exit(code)
+        workers[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        if not stopping:
+            print(f"Received {signal.Signals(signum).name}, draining {len(workers)} worker(s)...")
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Master {os.getpid()} listening on {args.host}:{args.port}, starting {args.workers} worker(s)")
+    for _ in range(args.workers):
+        spawn()
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        if time.monotonic() - started < FAST_EXIT:
+            print(f"Worker {pid} exited during startup (status {status}), stopping.")
+            failed = True
+            stop(signal.SIGTERM, None)
+            continue
+        print(f"Worker {pid} exited (status {status}), starting a new one.")
+        spawn()
+
+    sock.close()
+    print("All workers stopped.")
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import time
+
+# Startup timing breakdown. Each phase is the time since the previous checkpoint, starting when the `app` package is
+# imported. The lifespan prints them once the worker is ready, e.g.
+#   Startup: imports 412.3 ms, settings 3.1 ms, engine 25.7 ms, app imports 180.2 ms, first connection 8.4 ms, ...
+# `ready` is what the readiness probe (`/health/ready`) reports.
+
+_started = _last = time.perf_counter()
+timings: dict[str, float] = {} # phase -> seconds
+ready = False
+
+def record(phase: str):
+    global _last
+    now = time.perf_counter()
+    timings[phase] = now - _last
+    _last = now
+
+def summary() -> str:
+    phases = ", ".join(f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in timings.items())
+    return f"Startup: {phases} (total {(_last - _started) * 1000:.1f} ms)"
@@ -1,13 +1,108 @@
-from passlib.context import CryptContext
+import asyncio
 import hashlib
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from pwdlib import PasswordHash
+from pwdlib.exceptions import UnknownHashError
+from pwdlib.hashers.argon2 import Argon2Hasher
+from pwdlib.hashers.bcrypt import BcryptHasher
+from .config import settings
 
 # pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # def hash_password(password: str) -> str:
 #     return pwd_context.hash(password)
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode('utf-8')).hexdigest()
+# def hash_password(password: str) -> str:
+#     return hashlib.sha256(password.encode('utf-8')).hexdigest()
 
 # Once a password is hashed, it cannot be traced back to the original password
-def verify_password(plain_password: str, hashed_password: str) -> str:
-    return hash_password(plain_password) == hashed_password
\ No newline at end of file
+# def verify_password(plain_password: str, hashed_password: str) -> str:
+#     return hash_password(plain_password) == hashed_password
+
+# Passwords are hashed with Argon2id, a memory-hard KDF. New hashes always use the first hasher, bcrypt hashes are still
+# accepted. Hashes made before the switch are a bare SHA-256 hex digest: they are verified the old way and replaced by an
+# Argon2 hash on the next successful login (rehash-on-login). The same happens when the Argon2 cost settings change.
+password_hash = PasswordHash((
+    Argon2Hasher(
+        time_cost=settings.argon2_time_cost,
+        memory_cost=settings.argon2_memory_cost,
+        parallelism=settings.argon2_parallelism,
+    ),
+    BcryptHasher(),
+))
+
+# One Argon2 hash takes tens of milliseconds of CPU and `argon2_memory_cost` KiB of memory, so hashing runs on a bounded
+# pool instead of inline. argon2-cffi releases the GIL while hashing, so threads use every core. At most
+# `password_hash_workers + password_hash_queue` hashes can be running or waiting; past that, requests get a fast 503
+# instead of queueing without limit behind a login burst.
+_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="password-hash")
+_slots = threading.BoundedSemaphore(settings.password_hash_workers + settings.password_hash_queue)
+
+def _is_legacy_hash(hashed_password: str) -> bool:
+    return len(hashed_password) == 64 and all(char in "0123456789abcdef" for char in hashed_password)
+
+def _hash(password: str) -> str:
+    return password_hash.hash(password)
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    if _is_legacy_hash(hashed_password):
+        legacy_hash = hashlib.sha256(plain_password.encode('utf-8')).hexdigest()
+        if not hmac.compare_digest(legacy_hash, hashed_password):
+            return False, None
+        return True, password_hash.hash(plain_password)
+    try:
+        return password_hash.verify_and_update(plain_password, hashed_password)
+    except UnknownHashError:
+        return False, None
+
+def _submit(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password operations in progress, retry shortly.",
+            headers={"Retry-After": "1"},
+        )
+    future = _executor.submit(fn, *args)
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+# Sync API, for the sync endpoints: they already run in a threadpool thread, which waits for the hashing pool.
+def hash_password(password: str) -> str:
+    return _submit(_hash, password).result()
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return verify_and_update_password(plain_password, hashed_password)[0]
+
+# Returns (is_valid, new_hash). `new_hash` is set when the stored hash is outdated and should be replaced.
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return _submit(_verify_and_update, plain_password, hashed_password).result()
+
+# Bulk imports (POST /user/bulk, `python -m app.cli import-users`): every password of the batch goes to the pool, so they
+# are hashed in parallel. Instead of failing with a 503 the batch waits for free slots, and it never holds more than
+# `password_hash_workers` of them, so logins arriving meanwhile still get a slot.
+def hash_passwords(passwords: list[str]) -> list[str]:
+    window = threading.BoundedSemaphore(settings.password_hash_workers)
+    def release(_):
+        _slots.release()
+        window.release()
+    futures = []
+    for password in passwords:
+        window.acquire()
+        _slots.acquire()
+        future = _executor.submit(_hash, password)
+        future.add_done_callback(release)
+        futures.append(future)
+    return [future.result() for future in futures]
+
+# Async API, for the async endpoints: the event loop keeps serving other requests while the pool hashes.
+async def hash_password_async(password: str) -> str:
+    return await asyncio.wrap_future(_submit(_hash, password))
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return await asyncio.wrap_future(_submit(_verify_and_update, plain_password, hashed_password))
+
+async def hash_passwords_async(passwords: list[str]) -> list[str]:
+    return await asyncio.to_thread(hash_passwords, passwords)
@@ -0,0 +1,116 @@
+import threading
+from typing import Callable
+from fastapi import HTTPException, status
+
+# Write-behind buffer for votes (optional, see `Settings.vote_write_behind`).
+#
+# When a post goes viral, thousands of single-vote transactions fight over the same `post` row (votes_count) and the
+# same index pages. In write-behind mode the vote endpoint only records the user's latest intent in memory, keyed by
+# (user_id, post_id) so repeated like/unlike taps collapse into one entry, and a background thread writes the buffer
+# with one set-based statement per direction whenever `flush_size` votes are pending or every `flush_interval` seconds.
+#
+# - Memory is bounded: past `max_pending` distinct (user, post) keys new votes get a 503 until the next flush.
+# - `stop()` (called from the FastAPI lifespan on shutdown) flushes whatever is left.
+# - Read-your-own-writes: `pending_for()` returns a user's not-yet-written votes (including the batch being flushed),
+#   so the read endpoints can overlay them on the vote counts this user sees.
+# - A failed flush puts its votes back into the buffer (unless the user voted again meanwhile) and is retried.
+
+class VoteBuffer:
+    def __init__(self, flush_fn: Callable[[dict[tuple[int, int], int]], None], max_pending: int, flush_size: int, flush_interval: float):
+        self.flush_fn = flush_fn
+        self.max_pending = max_pending
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending: dict[tuple[int, int], int] = {}  # (user_id, post_id) -> vote_dir
+        self._flushing: dict[tuple[int, int], int] = {} # batch currently being written
+        self._users: dict[int, int] = {}                # user_id -> number of keys in _pending or _flushing
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+
+    def add(self, user_id: int, post_id: int, vote_dir: int):
+        key = (user_id, post_id)
+        with self._condition:
+            if key not in self._pending:
+                if len(self._pending) >= self.max_pending:
+                    self._condition.notify()
+                    raise HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        detail="Too many votes waiting to be written, retry shortly.",
+                        headers={"Retry-After": "1"},
+                    )
+                self._users[user_id] = self._users.get(user_id, 0) + 1
+            self._pending[key] = vote_dir
+            if len(self._pending) >= self.flush_size:
+                self._condition.notify()
+
+    def has_pending(self, user_id: int) -> bool:
+        with self._condition:
+            return user_id in self._users
+
+    def pending_for(self, user_id: int, post_ids) -> dict[int, int]:
+        # post_id -> vote_dir of this user's votes that may not be in the database yet. Newest intent wins.
+        with self._condition:
+            if user_id not in self._users:
+                return {}
+            result = {}
+            for post_id in post_ids:
+                vote_dir = self._pending.get((user_id, post_id), self._flushing.get((user_id, post_id)))
+                if vote_dir is not None:
+                    result[post_id] = vote_dir
+            return result
+
+    def flush(self):
+        # `_flush_lock` keeps the background thread and a shutdown flush from writing concurrently.
+        with self._flush_lock:
+            with self._condition:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+            try:
+                self.flush_fn(batch)
+            except Exception as e:
+                print(f"Vote buffer flush of {len(batch)} vote(s) failed, they will be retried: {e}")
+                with self._condition:
+                    for key, vote_dir in batch.items():
+                        if key not in self._pending:
+                            self._pending[key] = vote_dir
+                        else:
+                            self._release_user(key[0])
+                    self._flushing = {}
+                return
+            with self._condition:
+                self._flushing = {}
+                for user_id, _ in batch:
+                    self._release_user(user_id)
+
+    def _release_user(self, user_id: int):
+        count = self._users.get(user_id, 0) - 1
+        if count > 0:
+            self._users[user_id] = count
+        else:
+            self._users.pop(user_id, None)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._stopping or len(self._pending) >= self.flush_size, timeout=self.flush_interval)
+                if self._stopping:
+                    return
+            self.flush()
+
+    def start(self):
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="vote-buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
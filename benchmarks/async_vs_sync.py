@@ -0,0 +1,110 @@
+# Compares the throughput of the sync (threadpool) routers against the async routers at high concurrency.
+#
+# Each mode is started as its own uvicorn process (the mode is picked from `ASYNC_MODE` at import time), then hammered
+# with `concurrency` simultaneous `GET /posts/` requests for `duration` seconds.
+# It needs the same `.env` / database as the app itself:
+#
+#   python -m benchmarks.async_vs_sync --concurrency 200 --duration 20
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+
+def start_server(async_mode: bool, port: int) -> subprocess.Popen:
+    env = {**os.environ, "ASYNC_MODE": str(async_mode).lower()}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.orm_main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+
+
+async def wait_until_up(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get("/")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not start in time.")
+
+
+async def login(client: httpx.AsyncClient) -> str:
+    # A throwaway user (and one post) so that the benchmark can run against an empty database.
+    name = f"bench_{uuid.uuid4().hex[:8]}"
+    user = {"username": name, "email": f"{name}@example.com", "full_name": "Bench User", "password": "bench"}
+    await client.post("/user/", json=user)
+    response = await client.post("/login", data={"username": user["email"], "password": user["password"]})
+    token = response.json()["access_token"]
+    await client.post("/posts/", json={"title": "bench", "content": "bench"}, headers={"Authorization": f"Bearer {token}"})
+    return token
+
+
+async def run_load(base_url: str, concurrency: int, duration: float) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await wait_until_up(client)
+        headers = {"Authorization": f"Bearer {await login(client)}"}
+
+        latencies: list[float] = []
+        errors = 0
+        stop_at = time.monotonic() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.monotonic() < stop_at:
+                start = time.perf_counter()
+                try:
+                    response = await client.get("/posts/", params={"limit": 10}, headers=headers)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": quantiles[49] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async router throughput.")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    for async_mode in (False, True):
+        server = start_server(async_mode, args.port)
+        try:
+            result = asyncio.run(run_load(f"http://127.0.0.1:{args.port}", args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+        mode = "async" if async_mode else "sync"
+        print(
+            f"{mode:>5}: {result['rps']:8.1f} req/s | p50 {result['p50_ms']:7.1f} ms | p99 {result['p99_ms']:7.1f} ms "
+            f"| {result['requests']} requests, {result['errors']} errors (concurrency={args.concurrency})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# End-to-end latency and throughput of the main endpoints, with JSON baselines.
+#
+# The FastAPI `app` runs in-process behind httpx's ASGI transport (no server, no network), against the database from
+# `.env`, so the numbers cover routing, validation, authentication, the SQL and serialization. Every scenario runs at each
+# concurrency level, and reports p50/p95/p99 latency and throughput. Sync or async routers are picked by `ASYNC_MODE`.
+#
+#   python -m benchmarks.endpoints --concurrency 1 10 50 --requests 500
+#   python -m benchmarks.endpoints --save                 # write benchmarks/baselines/endpoints-<mode>.json
+#   python -m benchmarks.endpoints --compare              # diff against that baseline
+#
+# Baselines are meant to be committed, but none is yet: the first one is made by running with `--save` on the reference
+# machine and committing benchmarks/baselines/endpoints-<mode>.json. After a change, `--compare` (or `--save` and a diff
+# of the JSON file) shows the regression. Numbers from different machines are not comparable.
+#
+# Every user created by the run (the workers', and those of the create_user scenario) is deleted at the end, with their
+# posts and votes.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+from app.config import settings
+from app.orm_main import app
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+PASSWORD = "bench-password"
+
+
+class BenchUser:
+    def __init__(self, user_id: int, email: str, token: str, post_id: int):
+        self.id = user_id
+        self.email = email
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.post_id = post_id  # a post of this user, voted on by the vote scenario
+        self.liked = False
+
+
+async def create_user(client: httpx.AsyncClient) -> BenchUser:
+    name = f"bench_{uuid.uuid4().hex[:12]}"
+    user = {"username": name, "email": f"{name}@example.com", "full_name": "Bench User", "password": PASSWORD}
+    user_id = (await client.post("/user/", json=user)).raise_for_status().json()["id"]
+    response = await client.post("/login", data={"username": user["email"], "password": PASSWORD})
+    token = response.raise_for_status().json()["access_token"]
+    post = {"title": f"Bench post {name}", "content": "Benchmark post. " * 20}
+    response = await client.post("/posts/", json=post, headers={"Authorization": f"Bearer {token}"})
+    return BenchUser(user_id, user["email"], token, response.raise_for_status().json()["id"])
+
+
+# One request per call. `user` is the user of the worker running the scenario, `users` all the bench users.
+async def login(client, user, users):
+    return await client.post("/login", data={"username": user.email, "password": PASSWORD})
+
+async def list_posts(client, user, users):
+    return await client.get("/posts/", params={"limit": 10}, headers=user.headers)
+
+async def read_post(client, user, users):
+    return await client.get(f"/posts/{random.choice(users).post_id}", headers=user.headers)
+
+async def vote(client, user, users):
+    # Each worker toggles its like on its own post, so every vote changes something (no 409s)
+    user.liked = not user.liked
+    return await client.post("/vote/", json={"post_id": user.post_id, "vote_dir": int(user.liked)}, headers=user.headers)
+
+async def create_post(client, user, users):
+    return await client.post("/posts/", json={"title": "Bench", "content": "Benchmark post."}, headers=user.headers)
+
+created_user_ids: list[int] = [] # users of the create_user scenario, deleted at the end
+
+async def create_user_endpoint(client, user, users):
+    name = f"bench_{uuid.uuid4().hex[:12]}"
+    payload = {"username": name, "email": f"{name}@example.com", "full_name": "Bench User", "password": PASSWORD}
+    response = await client.post("/user/", json=payload)
+    if response.status_code == 201:
+        created_user_ids.append(response.json()["id"])
+    return response
+
+async def list_users(client, user, users):
+    return await client.get("/user/", params={"limit": 10}, headers=user.headers)
+
+async def read_user(client, user, users):
+    return await client.get(f"/user/{random.choice(users).id}")
+
+SCENARIOS = {
+    "login": login,
+    "list_posts": list_posts,
+    "read_post": read_post,
+    "vote": vote,
+    "create_post": create_post,
+    "create_user": create_user_endpoint,
+    "list_users": list_users,
+    "read_user": read_user,
+}
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario, users: list[BenchUser], concurrency: int, requests: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker(user: BenchUser):
+        nonlocal errors, remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await scenario(client, user, users)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(users[i]) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p95_ms": round(quantiles[94] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+    }
+
+
+async def run(scenarios: list[str], levels: list[int], requests: int) -> dict:
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    # The ASGI transport doesn't send lifespan events, so the app's startup/shutdown is run explicitly
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            users = []
+            try:
+                for _ in range(max(levels)):
+                    users.append(await create_user(client))
+                for name in scenarios:
+                    results[name] = {}
+                    for concurrency in levels:
+                        await SCENARIOS[name](client, users[0], users) # warm-up
+                        result = await run_scenario(client, SCENARIOS[name], users, concurrency, requests)
+                        results[name][str(concurrency)] = result
+                        print(
+                            f"{name:>12} c={concurrency:<4}: {result['rps']:8.1f} req/s | p50 {result['p50_ms']:7.2f} ms "
+                            f"| p95 {result['p95_ms']:7.2f} ms | p99 {result['p99_ms']:7.2f} ms | {result['errors']} errors"
+                        )
+            finally:
+                # Their posts (including those of the create_post scenario) and votes are deleted with them
+                for user_id in [user.id for user in users] + created_user_ids:
+                    (await client.delete(f"/user/{user_id}")).raise_for_status()
+    return results
+
+
+def compare(results: dict, baseline: dict):
+    print("\nChange against the baseline (latency: + is slower, throughput: - is slower):")
+    for name, levels in results.items():
+        for concurrency, result in levels.items():
+            base = baseline["results"].get(name, {}).get(concurrency)
+            if base is None:
+                continue
+            changes = " | ".join(
+                f"{key} {100 * (result[key] - base[key]) / base[key]:+6.1f}%"
+                for key in ("rps", "p50_ms", "p95_ms", "p99_ms")
+                if base[key]
+            )
+            print(f"{name:>12} c={concurrency:<4}: {changes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endpoint latency/throughput benchmark with JSON baselines.")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario and concurrency level")
+    parser.add_argument("--save", action="store_true", help="write the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare the results with the baseline")
+    args = parser.parse_args()
+
+    mode = "async" if settings.async_mode else "sync"
+    baseline_path = BASELINE_DIR / f"endpoints-{mode}.json"
+    results = asyncio.run(run(args.scenarios, args.concurrency, args.requests))
+
+    if args.compare:
+        if baseline_path.exists():
+            compare(results, json.loads(baseline_path.read_text()))
+        else:
+            print(f"\nNo baseline at {baseline_path}, run with --save first.")
+    if args.save:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        baseline = {
+            "mode": mode,
+            "requests": args.requests,
+            "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+            "results": results,
+        }
+        baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"\nBaseline written to {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Login throughput of the password hashing service: how many `/login` password checks per second (and per core) the
+# Argon2 settings from `.env` allow, through `utils.verify_and_update_password` (the hashing pool of
+# `password_hash_workers` threads and its `password_hash_queue` limit), for an increasing number of concurrent logins.
+#
+# Throughput stops growing once the callers outnumber the pool's threads, and callers beyond `workers + queue` get the
+# 503 the endpoint would return. No database is needed:
+#
+#   python -m benchmarks.password_hashing --logins 200
+#   PASSWORD_HASH_WORKERS=4 PASSWORD_HASH_QUEUE=8 python -m benchmarks.password_hashing --max-callers 64
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from app import utils
+from app.config import settings
+
+PASSWORD = "correct horse battery staple"
+
+
+def login(stored_hash: str) -> bool | None:
+    # True when the password was verified, None when the pool turned the login away
+    try:
+        return utils.verify_and_update_password(PASSWORD, stored_hash)[0]
+    except HTTPException:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Password verifications per second per core, through the hashing pool.")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--max-callers", type=int, default=2 * (settings.password_hash_workers + settings.password_hash_queue))
+    args = parser.parse_args()
+
+    stored_hash = utils.hash_password(PASSWORD)
+    print(
+        f"argon2id t={settings.argon2_time_cost} m={settings.argon2_memory_cost}KiB p={settings.argon2_parallelism} "
+        f"| pool: {settings.password_hash_workers} worker(s), queue {settings.password_hash_queue} | {os.cpu_count()} cores"
+    )
+
+    callers = 1
+    while callers <= args.max_callers:
+        # The callers play the endpoint threadpool: each one blocks on the hashing pool, like a sync `/login` does
+        with ThreadPoolExecutor(max_workers=callers) as executor:
+            start = time.perf_counter()
+            results = list(executor.map(lambda _: login(stored_hash), range(args.logins)))
+            elapsed = time.perf_counter() - start
+        verified = sum(result is True for result in results)
+        rejected = sum(result is None for result in results)
+        assert verified + rejected == args.logins
+        per_second = verified / elapsed
+        cores = min(settings.password_hash_workers, os.cpu_count() or 1)
+        print(
+            f"{callers:3d} caller(s): {per_second:8.1f} logins/s | {per_second / cores:8.1f} logins/s/core "
+            f"| {rejected} rejected (503)"
+        )
+        callers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Latency of the old substring search (`content ILIKE '%term%'`) vs. the GIN-indexed full-text search on a large post table.
+#
+# Seeds `--rows` posts (1 million by default) owned by a throwaway user, times both search modes for a few terms,
+# then removes the seeded data (the posts are deleted by the user's `ON DELETE CASCADE`).
+# It runs against the database from `.env`, with the migrations applied:
+#
+#   python -m benchmarks.search --rows 1000000
+
+import argparse
+import statistics
+import time
+import uuid
+
+from sqlalchemy import text, func
+from sqlmodel import Session, select
+
+from app.database import engine
+from app.models import Post
+from app.search import fulltext_match, fulltext_rank
+
+WORDS = [
+    "fastapi", "postgres", "python", "index", "latency", "cache", "async", "vote", "search", "query",
+    "backend", "server", "request", "token", "session", "engine", "router", "schema", "model", "cursor",
+]
+
+# Random titles and contents built in SQL, so seeding a million rows takes seconds instead of a million INSERTs.
+SEED_SQL = text("""
+    INSERT INTO post (title, content, owner_id)
+    SELECT
+        -- `0 * s.n` correlates the subqueries with the outer row, otherwise Postgres evaluates them once for all rows
+        (SELECT string_agg((:words)[1 + floor(random() * cardinality(:words))::int], ' ') FROM generate_series(1, 4 + 0 * s.n)),
+        (SELECT string_agg((:words)[1 + floor(random() * cardinality(:words))::int], ' ') FROM generate_series(1, 60 + 0 * s.n)),
+        :owner_id
+    FROM generate_series(1, :rows) AS s(n)
+""")
+
+
+def seed(session: Session, rows: int) -> int:
+    name = f"bench_{uuid.uuid4().hex[:8]}"
+    owner_id = session.execute(
+        text("""INSERT INTO "user" (username, email, full_name, password, hashed_password)
+                VALUES (:name, :email, 'Bench User', '', '') RETURNING id"""),
+        {"name": name, "email": f"{name}@example.com"},
+    ).scalar_one()
+    session.execute(SEED_SQL, {"words": WORDS, "owner_id": owner_id, "rows": rows})
+    session.commit()
+    session.execute(text("ANALYZE post"))
+    return owner_id
+
+
+def time_query(session: Session, statement, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        session.exec(statement).all()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Substring vs full-text post search latency.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        print(f"Seeding {args.rows} posts...")
+        owner_id = seed(session, args.rows)
+        try:
+            for term in ("postgres", "latency cache", '"async engine"'):
+                pattern = "%" + term.strip('"') + "%"
+                substring = select(Post.id).where(Post.content.ilike(pattern)).limit(args.limit)
+                rank = fulltext_rank(term)
+                fulltext = select(Post.id).where(fulltext_match(term)).order_by(rank.desc(), Post.id.desc()).limit(args.limit)
+                # Counting every match shows the cost when the LIMIT can't stop the scan early (e.g. rare terms, totals)
+                substring_count = select(func.count()).select_from(Post).where(Post.content.ilike(pattern))
+                fulltext_count = select(func.count()).select_from(Post).where(fulltext_match(term))
+
+                for label, statement in (
+                    ("substring", substring), ("fulltext ", fulltext),
+                    ("substring count", substring_count), ("fulltext  count", fulltext_count),
+                ):
+                    timings = time_query(session, statement, args.repeat)
+                    print(f"{term!r:>18} {label}: median {statistics.median(timings):9.2f} ms | max {max(timings):9.2f} ms")
+        finally:
+            session.rollback()
+            session.execute(text('DELETE FROM "user" WHERE id = :id'), {"id": owner_id})
+            session.commit()
+
+
+if __name__ == "__main__":
+    main()
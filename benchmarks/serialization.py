@@ -0,0 +1,72 @@
+# CPU cost of serializing one 100-post page of GET /posts: the previous path (validate every row into
+# PostPublic/PostWithVote, then FastAPI's `response_model` validation + serialization) against the single-pass
+# serializer in `app/serialization.py`. Both outputs are checked to be byte-for-byte identical.
+#
+# No database is needed, the rows are built in memory:
+#
+#   python -m benchmarks.serialization --pages 2000
+
+import argparse
+import time
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.models import Post, PostPublic, PostWithVote, User
+from app.serialization import dump_posts_with_votes
+
+
+def make_rows(count: int) -> list[tuple[Post, int]]:
+    owner = User(
+        id=1, username="author", email="author@example.com", full_name="Some Author", password="", hashed_password="",
+        date_created=datetime.now(timezone.utc), is_active=True,
+    )
+    return [
+        (Post(id=i, title=f"Post {i}", content="Lorem ipsum dolor sit amet. " * 20, owner_id=1, owner=owner,
+              created_at=datetime.now(timezone.utc)), i % 50)
+        for i in range(count)
+    ]
+
+
+def old_path(rows, adapter: TypeAdapter) -> bytes:
+    posts = [PostWithVote(post=PostPublic.model_validate(post), votes=votes) for post, votes in rows]
+    # What FastAPI does with the returned list (`serialize_response`): validate against response_model, serialize, render
+    validated = adapter.validate_python(posts, from_attributes=True)
+    return JSONResponse(adapter.dump_python(validated, mode="json")).body
+
+
+def measure(fn, pages: int) -> float:
+    start = time.process_time()
+    for _ in range(pages):
+        fn()
+    return (time.process_time() - start) / pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU per 100-post page, old vs. fast serialization.")
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    rows = make_rows(args.page_size)
+    adapter = TypeAdapter(List[PostWithVote])
+
+    # Byte-for-byte check against a real FastAPI response
+    app = FastAPI()
+    app.get("/posts", response_model=List[PostWithVote])(
+        lambda: [PostWithVote(post=PostPublic.model_validate(post), votes=votes) for post, votes in rows]
+    )
+    assert TestClient(app).get("/posts").content == dump_posts_with_votes(rows) == old_path(rows, adapter)
+
+    old = measure(lambda: old_path(rows, adapter), args.pages)
+    fast = measure(lambda: dump_posts_with_votes(rows), args.pages)
+    print(f"old path : {old * 1000:7.3f} ms CPU per {args.page_size}-post page")
+    print(f"fast path: {fast * 1000:7.3f} ms CPU per {args.page_size}-post page ({old / fast:.1f}x less)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Throughput of `python -m app.server` as the number of worker processes grows.
+#
+# For each worker count the server is started as its own process, then hammered with `concurrency` simultaneous
+# `GET /posts/` requests for `duration` seconds (same load as `benchmarks.async_vs_sync`). With one worker the CPU work
+# of a request (routing, validation, JWT, JSON) is serialized on one core, more workers spread it over the others.
+# It needs the same `.env` / database as the app itself:
+#
+#   python -m benchmarks.workers_scaling --workers 1 2 4 8 --concurrency 200 --duration 20
+#
+# Run the load generator on another machine (or leave cores free for it): on a fully loaded box the client competes
+# with the workers and the curve flattens early.
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.async_vs_sync import run_load
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--workers", str(workers), "--port", str(port), "--log-level", "warning"],
+    )
+
+
+def wait_until_ready(port: int, timeout: float = 60.0):
+    # Every worker must be past its lifespan startup, otherwise the first seconds run on fewer workers
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health/ready").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not start in time.")
+
+
+def default_worker_counts() -> list[int]:
+    counts, workers = [], 1
+    while workers < (os.cpu_count() or 1):
+        counts.append(workers)
+        workers *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput scaling with the number of server workers.")
+    parser.add_argument("--workers", nargs="+", type=int, default=default_worker_counts())
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in args.workers:
+        server = start_server(workers, args.port)
+        try:
+            wait_until_ready(args.port)
+            result = asyncio.run(run_load(f"http://127.0.0.1:{args.port}", args.concurrency, args.duration))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+        baseline = baseline or result["rps"]
+        print(
+            f"{workers:>3} worker(s): {result['rps']:8.1f} req/s ({result['rps'] / baseline:4.2f}x) "
+            f"| p50 {result['p50_ms']:7.1f} ms | p99 {result['p99_ms']:7.1f} ms "
+            f"| {result['requests']} requests, {result['errors']} errors"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+-- Denormalized vote counter on post (see `Post.votes_count`).
+-- `create_all` only creates missing tables, so databases created before this column existed need this script.
+-- The counter is back-filled from the vote table in the same transaction.
+
+BEGIN;
+
+ALTER TABLE post ADD COLUMN IF NOT EXISTS votes_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE post
+SET votes_count = counts.votes
+FROM (SELECT post_id, count(*) AS votes FROM vote GROUP BY post_id) AS counts
+WHERE post.id = counts.post_id;
+
+COMMIT;
@@ -0,0 +1,5 @@
+-- Composite indexes for the keyset (cursor) pagination of GET /posts.
+-- CONCURRENTLY avoids locking the post table for writes, which also means this script must not run inside a transaction.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_post_created_at_id ON post (created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_post_votes_count_id ON post (votes_count, id);
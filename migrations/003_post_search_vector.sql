@@ -0,0 +1,10 @@
+-- Full-text search document for posts (see `post_search_vector` in app/models.py).
+-- Adding a stored generated column rewrites the post table, so run this in a maintenance window on large databases.
+-- The GIN index is built CONCURRENTLY, so this script must not run inside a transaction.
+
+ALTER TABLE post ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(content, '')), 'B')
+) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_post_search_vector ON post USING gin (search_vector);
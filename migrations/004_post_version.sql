@@ -0,0 +1,3 @@
+-- Representation version of a post, used for the ETags of GET /posts and GET /posts/{id} (see `Post.version`).
+
+ALTER TABLE post ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
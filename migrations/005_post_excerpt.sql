@@ -0,0 +1,8 @@
+-- Precomputed excerpt of a post's content for sparse list views (see `Post.excerpt` and `make_excerpt()` in
+-- `app/projection.py`; the back-fill below applies the same rule).
+
+ALTER TABLE post ADD COLUMN IF NOT EXISTS excerpt VARCHAR NOT NULL DEFAULT '';
+
+UPDATE post
+SET excerpt = CASE WHEN char_length(content) <= 200 THEN content ELSE left(content, 199) || '…' END
+WHERE excerpt = '' AND content <> '';
@@ -0,0 +1,10 @@
+-- "Hot" ranking score of GET /posts/hot (see `post_hot_score` in app/models.py), kept up to date by Postgres whenever
+-- `votes_count` changes. Adding a stored generated column rewrites the post table, so run this in a maintenance window
+-- on large databases. The index is built CONCURRENTLY, so this script must not run inside a transaction.
+
+ALTER TABLE post ADD COLUMN IF NOT EXISTS hot_score double precision GENERATED ALWAYS AS (
+    (log(greatest(votes_count, 1)::double precision) +
+     extract(epoch FROM created_at - timestamptz '2024-01-01 00:00:00+00') / 45000)::double precision
+) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_post_hot_score_id ON post (hot_score, id);
@@ -0,0 +1,9 @@
+-- Schema version table, read on startup with DB_STARTUP=check (see `check_schema_version` in app/database.py).
+-- Run after 001-006. From now on, every migration script ends by stamping its own number.
+
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT timezone('utc', now())
+);
+
+INSERT INTO schema_version (version) VALUES (1), (2), (3), (4), (5), (6), (7) ON CONFLICT DO NOTHING;
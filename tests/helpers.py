@@ -0,0 +1,54 @@
+# Shared setup of the tests. They run the app in-process (httpx's ASGI transport) against the database configured in
+# `.env`, which must be a test database: the tests create users and posts, and delete them at the end. They are skipped
+# when the database can't be reached.
+
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.database import engine
+from app.orm_main import app
+
+PASSWORD = "test-password"
+
+
+def database_available() -> bool:
+    try:
+        with engine.connect():
+            return True
+    except OperationalError:
+        return False
+
+requires_database = pytest.mark.skipif(not database_available(), reason="needs the test database configured in .env")
+
+
+def run_with_client(check):
+    # The ASGI transport doesn't send lifespan events, so the app's startup/shutdown is run explicitly
+    async def run():
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=60) as client:
+                await check(client)
+
+    asyncio.run(run())
+
+
+async def create_user(client: httpx.AsyncClient, posts: int = 0) -> tuple[int, dict]:
+    # A new user with `posts` posts: (user id, authorization headers)
+    name = f"test_{uuid.uuid4().hex[:12]}"
+    user = {"username": name, "email": f"{name}@example.com", "full_name": "Test User", "password": PASSWORD}
+    user_id = (await client.post("/user/", json=user)).raise_for_status().json()["id"]
+    response = await client.post("/login", data={"username": user["email"], "password": PASSWORD})
+    headers = {"Authorization": f"Bearer {response.raise_for_status().json()['access_token']}"}
+    for index in range(posts):
+        post = {"title": f"Test post {index}", "content": "Test post."}
+        (await client.post("/posts/", json=post, headers=headers)).raise_for_status()
+    return user_id, headers
+
+
+async def delete_user(client: httpx.AsyncClient, user_id: int):
+    # Their posts and votes go with them
+    response = await client.delete(f"/user/{user_id}")
+    assert response.status_code == 200, response.text
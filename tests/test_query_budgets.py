@@ -0,0 +1,54 @@
+# Keeps the N+1 on the post endpoints from coming back: the listing and the detail must stay within their statement
+# budgets of `app/query_budget.py`, whatever the page size and the number of distinct owners on the page.
+# See `tests/helpers.py` for the database these tests need.
+#
+#   python -m pytest tests
+
+from app.query_budget import QUERY_BUDGETS, query_budget
+from tests.helpers import requires_database, run_with_client, create_user, delete_user
+
+pytestmark = requires_database
+
+OWNERS = 3
+POSTS_PER_OWNER = 34 # the 100-post page spans every owner
+
+
+def run_with_owners(check):
+    async def run(client):
+        owners = []
+        try:
+            for _ in range(OWNERS):
+                owners.append(await create_user(client, posts=POSTS_PER_OWNER))
+            await check(client, owners)
+        finally:
+            for user_id, _ in owners:
+                await delete_user(client, user_id)
+
+    run_with_client(run)
+
+
+def test_post_listing_budget():
+    async def check(client, owners):
+        _, headers = owners[0]
+        budget = QUERY_BUDGETS["GET /posts/"]
+        # A fresh request: nothing is cached yet, so this is the worst case the budget covers
+        with query_budget(budget, "GET /posts/?limit=100"):
+            response = await client.get("/posts/", params={"limit": 100}, headers=headers)
+        assert response.status_code == 200
+        posts = response.json()
+        assert len(posts) == 100
+        assert len({post["post"]["owner_id"] for post in posts}) >= OWNERS
+
+    run_with_owners(check)
+
+
+def test_post_detail_budget():
+    async def check(client, owners):
+        _, headers = owners[0]
+        _, other_headers = owners[1]
+        post_id = (await client.get("/posts/", params={"limit": 1}, headers=other_headers)).raise_for_status().json()[0]["post"]["id"]
+        with query_budget(QUERY_BUDGETS["GET /posts/{post_id}"], "GET /posts/{post_id}"):
+            response = await client.get(f"/posts/{post_id}", headers=headers)
+        assert response.status_code == 200
+
+    run_with_owners(check)
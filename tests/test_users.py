@@ -0,0 +1,27 @@
+from tests.helpers import requires_database, run_with_client, create_user, delete_user
+
+pytestmark = requires_database
+
+
+def test_delete_user_with_posts_and_votes():
+    # The user's posts and votes are deleted by `ON DELETE CASCADE`, and their likes taken off the other posts' counters
+    async def check(client):
+        owner_id, owner_headers = await create_user(client, posts=2)
+        other_id, other_headers = await create_user(client, posts=1)
+        try:
+            owner_post = (await client.get("/posts/", params={"limit": 1, "show_all": False}, headers=owner_headers)).json()[0]
+            other_post = (await client.get("/posts/", params={"limit": 1, "show_all": False}, headers=other_headers)).json()[0]
+            for post_id, headers in ((other_post["post"]["id"], owner_headers), (owner_post["post"]["id"], other_headers)):
+                response = await client.post("/vote/", json={"post_id": post_id, "vote_dir": 1}, headers=headers)
+                assert response.status_code == 201, response.text
+
+            await delete_user(client, owner_id)
+
+            response = await client.get(f"/posts/{owner_post['post']['id']}", headers=other_headers)
+            assert response.status_code == 404
+            response = await client.get(f"/posts/{other_post['post']['id']}", headers=other_headers)
+            assert response.json()["votes"] == 0
+        finally:
+            await delete_user(client, other_id)
+
+    run_with_client(check)